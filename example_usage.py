@@ -4,6 +4,7 @@ Example usage of the ID Processor with Grok API
 """
 
 import os
+from pathlib import Path
 from process import IDProcessor
 
 def example_usage():
@@ -40,5 +41,24 @@ def example_usage():
     for key, value in result.items():
         print(f"{key.replace('_', ' ').title()}: {value}")
 
+def example_batch_usage():
+    """
+    Example of processing a folder of ID images concurrently.
+    """
+    api_key = os.getenv("XAI_API_KEY")
+    if not api_key:
+        print("Please set your XAI_API_KEY environment variable")
+        return
+
+    processor = IDProcessor(api_key, max_workers=8)
+    image_paths = [str(path) for path in Path("path/to/id_images").glob("*.jpg")]
+
+    # Results arrive as each image finishes, not in input order
+    for item in processor.process_batch(image_paths):
+        print(f"[{item.completed}/{item.total}] {item.image_path} ({item.seconds}s): {item.result}")
+
+    if image_paths:
+        print(f"Throughput: {item.images_per_second} images/second")
+
 if __name__ == "__main__":
     example_usage()
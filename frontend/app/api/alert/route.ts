@@ -6,12 +6,19 @@ export async function POST(request: NextRequest) {
   try {
     const alertData = await request.json();
 
+    // Forward the client's idempotency key so retries don't re-send the alert
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/json',
+    };
+    const idempotencyKey = request.headers.get('idempotency-key');
+    if (idempotencyKey) {
+      headers['Idempotency-Key'] = idempotencyKey;
+    }
+
     // Call backend alert API
     const response = await fetch(`${BACKEND_URL}/alert`, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
+      headers,
       body: JSON.stringify(alertData),
     });
 
@@ -26,7 +33,9 @@ export async function POST(request: NextRequest) {
     return NextResponse.json({
       success: result.success,
       message: result.message,
-      recipients_contacted: result.recipients_contacted,
+      job_id: result.job_id,
+      recipients_queued: result.recipients_queued,
+      duplicate: result.duplicate,
     });
 
   } catch (error) {
@@ -5,25 +5,270 @@ Extracts first name, last name, gender, and birthday from ID images using Grok-2
 """
 
 import os
+import argparse
 import base64
+import glob
+import hashlib
+import io
 import json
 import requests
 import sys
-from typing import Dict, Optional
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
 from pathlib import Path
 
+from requests.adapters import HTTPAdapter
+
+try:
+    from PIL import Image, ImageChops, ImageOps
+except ImportError:  # Pillow is optional: without it images are uploaded unchanged
+    Image = ImageChops = ImageOps = None
+
+try:
+    # Optional plugin that lets Pillow decode HEIC photos from iPhones
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+    HEIF_SUPPORT = True
+except ImportError:
+    HEIF_SUPPORT = False
+
+DEFAULT_MAX_WORKERS = 8
+REQUEST_TIMEOUT_SECONDS = 60
+
+# ID text stays legible well below phone camera resolution
+DEFAULT_MAX_EDGE = 1600
+DEFAULT_JPEG_QUALITY = 85
+# How far a border pixel may differ from the corner colour and still be cropped
+CROP_TOLERANCE = 24
+
+# Bump whenever the extraction prompt in process_id_image changes so cached
+# results from the old prompt are no longer used
+PROMPT_VERSION = 1
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "id-processor"
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Request formats for sending the image, in the order they are tried
+REQUEST_FORMATS = ("content_array", "inline_image")
+# Statuses meaning the endpoint rejected the request's shape, worth trying
+# another format for; throttling and server errors are not
+FORMAT_ERROR_STATUS_CODES = frozenset((400, 415, 422))
+
+# Format each (endpoint, model) accepted, shared by every IDProcessor in the process
+_accepted_formats: Dict[Tuple[str, str], str] = {}
+
+# Files picked up when a directory or glob is given on the command line
+IMAGE_EXTENSIONS = frozenset((".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".bmp", ".tif", ".tiff"))
+
+# Leading bytes of the image formats we recognise
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+# ISO base media brands used by HEIC/HEIF photos
+HEIF_BRANDS = frozenset((b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"))
+
+# Formats the vision API accepts as-is; anything else must be converted to JPEG
+UPLOAD_MIME_TYPES = frozenset(("image/jpeg", "image/png", "image/gif", "image/webp"))
+
+
+def detect_mime_type(data: bytes) -> str:
+    """
+    Detect an image's MIME type from its leading bytes, defaulting to JPEG.
+    """
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:8] == b"ftyp" and data[8:12] in HEIF_BRANDS:
+        return "image/heic"
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    return "image/jpeg"
+
+
+class PreparedImage(NamedTuple):
+    """An ID image ready to upload"""
+    mime_type: str
+    base64_data: str
+    original_bytes: int  # size of the file on disk
+    upload_bytes: int  # size of the image actually sent, before base64
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{self.base64_data}"
+
+
+class BatchItem(NamedTuple):
+    """One finished image from IDProcessor.process_batch"""
+    image_path: str
+    result: Dict[str, str]
+    seconds: float  # time spent on this image
+    completed: int  # images finished so far, including this one
+    total: int
+    images_per_second: float  # overall throughput so far; final on the last item
+
+
+class ResultCache:
+    """
+    On-disk cache of extraction results, keyed by image content
+    
+    Each result is a small JSON file named by the SHA-256 of the model, the
+    prompt version and the image bytes, so a re-scanned image hits no
+    matter what its file is called. Reads refresh a file's modification
+    time and, once the cache grows past max_bytes, the least recently used
+    files are deleted. Results hold personal data, so files are only
+    readable by the current user.
+    """
+
+    def __init__(self, directory: Union[str, Path] = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        """
+        Args:
+            directory (str | Path): Where cached results are stored
+            max_bytes (int): Size the cache is trimmed back to
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size: Optional[int] = None  # measured on first write
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultCache"]:
+        """
+        Cache configured by ID_CACHE_DIR and ID_CACHE_MAX_MB; None if ID_CACHE_DIR is set empty.
+        """
+        directory = os.getenv("ID_CACHE_DIR", str(DEFAULT_CACHE_DIR))
+        if not directory:
+            return None
+        max_mb = float(os.getenv("ID_CACHE_MAX_MB", DEFAULT_CACHE_MAX_BYTES / (1024 * 1024)))
+        return cls(directory, int(max_mb * 1024 * 1024))
+
+    @staticmethod
+    def key(image_data: bytes, model: str, prompt_version: int = PROMPT_VERSION) -> str:
+        digest = hashlib.sha256(f"{model}\0{prompt_version}\0".encode())
+        digest.update(image_data)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """
+        Cached result for key, or None.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r") as cache_file:
+                result = json.load(cache_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: Dict[str, str]) -> None:
+        """
+        Store a result, evicting old entries if the cache is over its size limit.
+        """
+        path = self._path(key)
+        try:
+            path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            # Write then rename so readers never see a partial file
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as cache_file:
+                json.dump(result, cache_file)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not write ID result cache: {e}", file=sys.stderr)
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._measure()
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for path in self.directory.glob("*/*.json"):
+            try:
+                yield path, path.stat()
+            except OSError:
+                continue
+
+    def _measure(self) -> int:
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def _evict(self) -> None:
+        """
+        Delete least recently used entries until the cache is at 90% of max_bytes.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        size = sum(stat.st_size for _, stat in entries)
+        target = self.max_bytes * 0.9
+        for path, stat in entries:
+            if size <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            size -= stat.st_size
+        self._size = size
+
 
 class IDProcessor:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_edge: int = DEFAULT_MAX_EDGE,
+        jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+        cache: Optional[ResultCache] = None,
+    ):
         """
         Initialize the ID processor with Grok API key.
         
         Args:
             api_key (str): Your XAI API key
+            max_workers (int): Images processed at once by process_batch
+            max_edge (int): Longest side in pixels of uploaded images (0 uploads files unchanged)
+            jpeg_quality (int): JPEG quality used when recompressing images
+            cache (Optional[ResultCache]): Where to look up and store extraction results
         """
         self.api_key = api_key
         self.api_url = "https://api.x.ai/v1/chat/completions"
         self.model = "grok-2-vision-1212"  # Use the vision model for image processing
+        self.max_workers = max_workers
+        self.max_edge = max_edge
+        self.jpeg_quality = jpeg_quality
+        self.cache = cache
+        # Extra posts of the whole image made by falling back to another
+        # request format, and those skipped thanks to the remembered format
+        self.format_stats = {"fallbacks": 0, "retries_avoided": 0}
+        self._stats_lock = threading.Lock()
+
+        # One keep-alive session so requests reuse TLS connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        })
         
     def encode_image_to_base64(self, image_path: str) -> str:
         """
@@ -42,7 +287,217 @@ class IDProcessor:
             raise FileNotFoundError(f"Image file not found: {image_path}")
         except Exception as e:
             raise Exception(f"Error encoding image: {str(e)}")
+
+    def prepare_image(self, image_path: str) -> PreparedImage:
+        """
+        Read an ID image and shrink it for upload.
+        
+        With Pillow installed the image is rotated upright, cropped to the
+        card, scaled down to max_edge and recompressed as JPEG. The original
+        file is sent instead when Pillow is missing, cannot read it, or the
+        result would not be smaller. Formats the API does not accept (HEIC,
+        BMP, TIFF) are always converted to JPEG.
+        
+        Args:
+            image_path (str): Path to the image file
+            
+        Returns:
+            PreparedImage: The image to upload and its sizes
+            
+        Raises:
+            ValueError: The image is in a format the API does not accept and cannot be converted
+        """
+        return self._prepare(self._read_image(image_path), image_path)
+
+    @staticmethod
+    def _read_image(image_path: str) -> bytes:
+        try:
+            with open(image_path, "rb") as image_file:
+                return image_file.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Image file not found: {image_path}")
+
+    def _prepare(self, original: bytes, image_path: str) -> PreparedImage:
+        original_type = detect_mime_type(original)
+        must_convert = original_type not in UPLOAD_MIME_TYPES
+
+        upload = None
+        conversion_error = None
+        if Image is not None and (self.max_edge > 0 or must_convert):
+            try:
+                upload = self._shrink_image(original)
+            except Exception as e:
+                conversion_error = e
+                if not must_convert:
+                    print(f"Could not preprocess {image_path}, uploading it unchanged: {e}", file=sys.stderr)
+
+        if upload is not None and (must_convert or upload.getbuffer().nbytes < len(original)):
+            mime_type = "image/jpeg"
+            data = upload.getbuffer()
+        elif must_convert:
+            is_heic = original_type == "image/heic"
+            if Image is None:
+                hint = " (install Pillow and pillow-heif)" if is_heic else " (install Pillow)"
+            elif is_heic and not HEIF_SUPPORT:
+                hint = " (install pillow-heif)"
+            else:
+                hint = f": {conversion_error}"
+            raise ValueError(f"Cannot convert {original_type} image {image_path} for upload{hint}")
+        else:
+            mime_type = original_type
+            data = original
+
+        prepared = PreparedImage(
+            mime_type=mime_type,
+            base64_data=base64.b64encode(data).decode("ascii"),
+            original_bytes=len(original),
+            upload_bytes=len(data),
+        )
+        # Release the buffer view so the BytesIO can be freed
+        del data
+        return prepared
+
+    def _shrink_image(self, original: bytes) -> io.BytesIO:
+        assert Image is not None and ImageOps is not None, "callers check for Pillow"
+        with Image.open(io.BytesIO(original)) as image:
+            # Let the JPEG decoder scale down while decoding instead of
+            # materialising the full-resolution frame
+            if self.max_edge > 0:
+                image.draft("RGB", (self.max_edge, self.max_edge))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+
+        image = self._crop_background(image)
+        if self.max_edge > 0:
+            image.thumbnail((self.max_edge, self.max_edge), Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=self.jpeg_quality, optimize=True)
+        return output
+
+    @staticmethod
+    def _crop_background(image):
+        """
+        Trim a plain border around the card (table, scanner bed) if there is one.
+        """
+        assert Image is not None and ImageChops is not None, "callers check for Pillow"
+        background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+        difference = ImageChops.difference(image, background).convert("L")
+        mask = difference.point([255 if value > CROP_TOLERANCE else 0 for value in range(256)])
+        box = mask.getbbox()
+        if box is None:
+            return image
+        # Keep the whole frame if "cropping" would cut into the card itself
+        left, top, right, bottom = box
+        if (right - left) * (bottom - top) < image.width * image.height // 4:
+            return image
+        return image.crop(box)
     
+    def _build_payload(self, request_format: str, prompt: str, image: PreparedImage) -> dict:
+        if request_format == "content_array":
+            # Image in content array format
+            return {
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": prompt
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": image.data_url
+                                }
+                            }
+                        ]
+                    }
+                ],
+                "model": self.model,
+                "stream": False,
+                "temperature": 0.1
+            }
+        return {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f"{prompt}\n\n[Image attached: {image.base64_data[:50]}...]"
+                }
+            ],
+            "model": self.model,
+            "stream": False,
+            "temperature": 0.1,
+            "image": image.base64_data
+        }
+
+    def _count(self, stat: str) -> None:
+        with self._stats_lock:
+            self.format_stats[stat] += 1
+
+    def _post_extraction_request(self, prompt: str, image: PreparedImage) -> requests.Response:
+        """
+        Post the extraction request in a format the endpoint accepts.
+        
+        The first format that succeeds is remembered for the endpoint and
+        model, and later images are sent in it directly. Another format is
+        only tried when the endpoint rejects the request's shape (see
+        FORMAT_ERROR_STATUS_CODES); on throttling or server errors the image
+        is not posted again.
+        
+        Raises:
+            requests.exceptions.HTTPError: The endpoint returned an error
+        """
+        endpoint = (self.api_url, self.model)
+        remembered = _accepted_formats.get(endpoint)
+        if remembered is not None:
+            if remembered != REQUEST_FORMATS[0]:
+                # Without the remembered format this image would be posted
+                # in the failing format first
+                self._count("retries_avoided")
+            formats = [remembered]
+        else:
+            formats = list(REQUEST_FORMATS)
+
+        response = None
+        for index, request_format in enumerate(formats):
+            payload = self._build_payload(request_format, prompt, image)
+            response = self.session.post(self.api_url, json=payload, timeout=REQUEST_TIMEOUT_SECONDS)
+            if response.status_code == 200:
+                _accepted_formats[endpoint] = request_format
+                return response
+
+            print(f"API Error - Status Code: {response.status_code}", file=sys.stderr)
+            print(f"Response: {response.text[:500]}", file=sys.stderr)
+
+            is_last = index == len(formats) - 1
+            if response.status_code not in FORMAT_ERROR_STATUS_CODES:
+                if not is_last:
+                    self._count("retries_avoided")
+                break
+            if remembered is not None:
+                # The endpoint may have changed; detect the format again next time
+                _accepted_formats.pop(endpoint, None)
+            if not is_last:
+                print("Trying alternative request format...", file=sys.stderr)
+                self._count("fallbacks")
+
+        if response is None:
+            raise ValueError("No request formats to try")
+        response.raise_for_status()
+        return response
+
+    def format_summary(self) -> str:
+        """
+        One-line summary of request format fallbacks and retries avoided.
+        """
+        with self._stats_lock:
+            stats = dict(self.format_stats)
+        request_format = _accepted_formats.get((self.api_url, self.model), "not yet detected")
+        return (
+            f"Request format: {request_format}; {stats['fallbacks']} fallback posts, "
+            f"{stats['retries_avoided']} duplicate image posts avoided"
+        )
+
     def process_id_image(self, image_path: str) -> Dict[str, str]:
         """
         Process ID image and extract personal information.
@@ -53,8 +508,29 @@ class IDProcessor:
         Returns:
             Dict[str, str]: Dictionary containing extracted information
         """
-        # Encode image to base64
-        base64_image = self.encode_image_to_base64(image_path)
+        try:
+            original = self._read_image(image_path)
+
+            # A re-scanned ID gives the same bytes: reuse its earlier result
+            cache_key = None
+            if self.cache is not None:
+                cache_key = ResultCache.key(original, self.model)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+            # Shrink and encode the image
+            image = self._prepare(original, image_path)
+            del original
+        except (OSError, ValueError) as e:
+            # Missing, unreadable or unconvertible file
+            return {
+                "error": str(e),
+                "first_name": "Error",
+                "last_name": "Error",
+                "gender": "Error",
+                "birthday": "Error"
+            }
         
         # Prepare the prompt for ID information extraction
         prompt = """Please analyze this ID image and extract the following information in JSON format:
@@ -68,67 +544,8 @@ class IDProcessor:
         If any information is not clearly visible or readable, use "Not Found" as the value.
         Please respond with only the JSON object, no additional text."""
         
-        # Prepare the request payload - try different formats
-        # First, try with image in content array format
-        payload = {
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "model": self.model,
-            "stream": False,
-            "temperature": 0.1
-        }
-        
-        # Set up headers
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
         try:
-            # Make API request
-            response = requests.post(self.api_url, headers=headers, json=payload)
-            
-            # Debug: Print response details if there's an error
-            if response.status_code != 200:
-                print(f"API Error - Status Code: {response.status_code}")
-                print(f"Response: {response.text}")
-                
-                # Try alternative format if first attempt fails
-                print("Trying alternative request format...")
-                alt_payload = {
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": f"{prompt}\n\n[Image attached: {base64_image[:50]}...]"
-                        }
-                    ],
-                    "model": self.model,
-                    "stream": False,
-                    "temperature": 0.1,
-                    "image": base64_image
-                }
-                
-                response = requests.post(self.api_url, headers=headers, json=alt_payload)
-                
-                if response.status_code != 200:
-                    print(f"Alternative format also failed - Status Code: {response.status_code}")
-                    print(f"Response: {response.text}")
-                    response.raise_for_status()
+            response = self._post_extraction_request(prompt, image)
             
             # Parse response
             response_data = response.json()
@@ -147,6 +564,9 @@ class IDProcessor:
                         content = content[:-3]
                     
                     extracted_info = json.loads(content)
+                    # Only successful parses are cached, never error placeholders
+                    if self.cache is not None and cache_key is not None and isinstance(extracted_info, dict):
+                        self.cache.put(cache_key, extracted_info)
                     return extracted_info
                     
                 except json.JSONDecodeError:
@@ -181,11 +601,187 @@ class IDProcessor:
                 "birthday": "Error"
             }
 
+    def _timed_process(self, image_path: str):
+        started = time.perf_counter()
+        try:
+            result = self.process_id_image(image_path)
+        except Exception as e:
+            # Unreadable files shouldn't stop the rest of the batch
+            result = {"error": str(e)}
+        return result, time.perf_counter() - started
+
+    def process_batch(self, image_paths: Iterable[str], max_workers: Optional[int] = None) -> Iterator[BatchItem]:
+        """
+        Process many ID images concurrently over the pooled session.
+        
+        Args:
+            image_paths (Iterable[str]): Paths to the ID image files
+            max_workers (Optional[int]): Images processed at once (defaults to self.max_workers,
+                which also sizes the connection pool and so caps this)
+            
+        Yields:
+            BatchItem: Each image's result and timing, in order of completion
+            
+        Raises:
+            ValueError: If max_workers exceeds self.max_workers
+        """
+        max_workers = max_workers or self.max_workers
+        if max_workers > self.max_workers:
+            # Threads beyond the pool size would open and discard a connection per request
+            raise ValueError(
+                f"max_workers={max_workers} exceeds this processor's connection pool "
+                f"of {self.max_workers}; create the IDProcessor with more workers"
+            )
+        image_paths = list(image_paths)
+        started = time.perf_counter()
+        completed = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self._timed_process, path): path for path in image_paths}
+            try:
+                for future in as_completed(futures):
+                    result, seconds = future.result()
+                    completed += 1
+                    elapsed = time.perf_counter() - started
+                    yield BatchItem(
+                        image_path=futures[future],
+                        result=result,
+                        seconds=round(seconds, 3),
+                        completed=completed,
+                        total=len(image_paths),
+                        images_per_second=round(completed / elapsed, 2) if elapsed > 0 else 0.0,
+                    )
+            finally:
+                # Stop queued images if the caller stops iterating early
+                for future in futures:
+                    future.cancel()
+
+
+def expand_image_paths(patterns: Iterable[str]) -> list:
+    """
+    Expand files, directories (searched recursively) and glob patterns into image paths.
+    
+    Args:
+        patterns (Iterable[str]): Paths, directories or globs such as "scans/**/*.jpg"
+        
+    Returns:
+        list: Matching image file paths, sorted and without duplicates
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(
+                str(path) for path in Path(pattern).rglob("*")
+                if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+            )
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+        elif glob.has_magic(pattern):
+            paths.update(
+                path for path in glob.glob(pattern, recursive=True)
+                if os.path.isfile(path) and Path(path).suffix.lower() in IMAGE_EXTENSIONS
+            )
+        else:
+            print(f"Warning: No such file or directory: {pattern}", file=sys.stderr)
+    return sorted(paths)
+
+
+def extraction_succeeded(result: Dict[str, str]) -> bool:
+    """
+    Whether a process_id_image result holds extracted fields rather than an
+    error or the "Error parsing JSON" placeholder.
+    """
+    return isinstance(result, dict) and "error" not in result and "raw_response" not in result
+
+
+def completed_image_paths(output_path: str) -> set:
+    """
+    Absolute paths of images with a successful result already in a JSONL output file.
+    
+    Only lines marked "ok" count, so a re-run retries images that failed.
+    """
+    done = set()
+    try:
+        with open(output_path, "r") as output_file:
+            for line in output_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by an interrupted run
+                    continue
+                if isinstance(record, dict) and "image_path" in record and record.get("ok") is True:
+                    done.add(os.path.abspath(record["image_path"]))
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def process_many(processor: IDProcessor, image_paths: list, output_path: Optional[str] = None) -> None:
+    """
+    Process several images concurrently, writing one JSON line per image as it completes.
+    
+    Args:
+        processor (IDProcessor): Processor to run the images through
+        image_paths (list): Paths to the ID image files
+        output_path (Optional[str]): JSONL file to append results to (stdout if not given).
+            Images already recorded there successfully are skipped, so an interrupted
+            run can simply be started again.
+    """
+    output = sys.stdout
+    if output_path:
+        done = completed_image_paths(output_path)
+        skipped = len(image_paths)
+        image_paths = [path for path in image_paths if os.path.abspath(path) not in done]
+        skipped -= len(image_paths)
+        if skipped:
+            print(f"Skipping {skipped} images already in {output_path}", file=sys.stderr)
+
+        output = open(output_path, "a+")
+        # Start on a fresh line if the last run was interrupted mid-write
+        output.seek(0, os.SEEK_END)
+        if output.tell() > 0:
+            output.seek(output.tell() - 1)
+            if output.read(1) != "\n":
+                output.write("\n")
+
+    last = None
+    try:
+        for item in processor.process_batch(image_paths):
+            last = item
+            # Our fields last so a stray key in the model's answer can't replace them
+            record = {
+                **item.result,
+                "image_path": item.image_path,
+                "ok": extraction_succeeded(item.result),
+                "seconds": item.seconds,
+            }
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            if output_path:
+                print(
+                    f"\r[{item.completed}/{item.total}] {item.images_per_second} images/second",
+                    end="", file=sys.stderr, flush=True,
+                )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+            print(file=sys.stderr)
+
+    if last:
+        print(f"Processed {last.completed} images at {last.images_per_second} images/second", file=sys.stderr)
+        print(processor.format_summary(), file=sys.stderr)
+
 
 def main():
     """
     Main function to demonstrate ID processing.
     """
+    parser = argparse.ArgumentParser(description="Extract name, gender and birthday from ID images with Grok")
+    parser.add_argument("paths", nargs="*", help="image files, directories or glob patterns")
+    parser.add_argument("-o", "--output", help="append JSONL results here, skipping images already in it")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_WORKERS, help="images processed at once")
+    args = parser.parse_args()
+
     # Get API key from environment variable
     api_key = os.getenv("XAI_API_KEY")
     if not api_key:
@@ -193,12 +789,23 @@ def main():
         print("Example: export XAI_API_KEY='your_api_key_here'")
         return
     
-    # Initialize processor
-    processor = IDProcessor(api_key)
+    # Initialize processor, caching results so re-scanned IDs skip the API
+    processor = IDProcessor(api_key, max_workers=args.workers, cache=ResultCache.from_env())
     
+    # Several images, a directory, a glob or an output file: batch mode
+    if args.output or len(args.paths) > 1 or any(
+        os.path.isdir(path) or (glob.has_magic(path) and not os.path.isfile(path)) for path in args.paths
+    ):
+        image_paths = expand_image_paths(args.paths)
+        if not image_paths:
+            print("Error: No images found")
+            return
+        process_many(processor, image_paths, args.output)
+        return
+
     # Check if image path provided as command line argument
-    if len(sys.argv) > 1:
-        image_path = sys.argv[1]
+    if args.paths:
+        image_path = args.paths[0]
     else:
         # Get image path from user input
         print("ID Image Processor with Grok API")
@@ -0,0 +1,125 @@
+"""
+Local stand-in for the VAPI call API, for benchmarks
+
+POST /call answers 201 after a configurable latency, fails a configurable
+fraction of calls with 500 and, when a rate limit is set, answers 429 with a
+Retry-After header once callers exceed it. GET /stats reports what it saw.
+
+    python mock_vapi.py --port 9010 --latency-ms 80 --error-rate 0.01 --rate-limit 50
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(
+    latency_ms: float = 50.0,
+    jitter_ms: float = 10.0,
+    error_rate: float = 0.0,
+    rate_limit: float = 0.0,
+    retry_after_seconds: float = 1.0,
+    seed: int = 0,
+) -> FastAPI:
+    """
+    Build the mock VAPI app
+
+    Args:
+        latency_ms: Mean time to answer a call request
+        jitter_ms: Uniform +/- spread around latency_ms
+        error_rate: Fraction of accepted calls answered with HTTP 500
+        rate_limit: Calls per second accepted before answering 429 (0 disables)
+        retry_after_seconds: Retry-After sent with 429 responses
+        seed: Seed for latency jitter and injected errors
+    """
+    app = FastAPI(title="Mock VAPI")
+    rng = random.Random(seed)
+    stats = {"calls": 0, "created": 0, "errors": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0}
+    bucket = {"tokens": rate_limit, "updated": time.monotonic()}
+
+    def take_token() -> bool:
+        if rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        bucket["tokens"] = min(rate_limit, bucket["tokens"] + (now - bucket["updated"]) * rate_limit)
+        bucket["updated"] = now
+        if bucket["tokens"] < 1:
+            return False
+        bucket["tokens"] -= 1
+        return True
+
+    @app.post("/call")
+    async def create_call(request: Request):
+        payload = await request.json()
+        stats["calls"] += 1
+        if not take_token():
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"message": "Too many requests"},
+                status_code=429,
+                headers={"Retry-After": f"{retry_after_seconds:g}"},
+            )
+
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+            await asyncio.sleep(delay)
+        finally:
+            stats["in_flight"] -= 1
+
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"message": "Injected failure"}, status_code=500)
+
+        stats["created"] += 1
+        return JSONResponse(
+            {"id": str(uuid.uuid4()), "status": "queued", "customer": payload.get("customer")},
+            status_code=201,
+        )
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        for key in stats:
+            if key != "in_flight":
+                stats[key] = 0
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the VAPI call API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9010)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="calls per second before 429s (0 disables)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = create_app(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        retry_after_seconds=args.retry_after,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
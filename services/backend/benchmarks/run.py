@@ -0,0 +1,307 @@
+"""
+Benchmark the backend against a local VAPI stand-in
+
+Starts mock_vapi.py and the backend (uvicorn) as subprocesses, then for each
+population size registers users up to that size and measures:
+
+- /register throughput
+- /location ingest throughput
+- /locations read latency
+- alert fan-out time to every registered user
+
+Results are written as JSON so runs can be compared between commits:
+
+    python run.py --sizes 100,1000,5000 --output before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+BACKEND_SRC = BENCHMARKS_DIR.parent / "src"
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict:
+    """Throughput and latency percentiles (ms) for a set of timed requests"""
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        if not ordered:
+            return 0.0
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        "requests": len(ordered),
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(ordered) / elapsed, 1) if elapsed > 0 else None,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+async def run_concurrent(
+    count: int, concurrency: int, request: Callable[[int], Awaitable[httpx.Response]]
+) -> dict:
+    """Issue `count` requests with at most `concurrency` outstanding"""
+    latencies: list[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < count:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            response = await request(index)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, count))))
+    result = summarize(latencies, time.perf_counter() - started)
+    result["errors"] = errors
+    return result
+
+
+async def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up within {timeout}s")
+            await asyncio.sleep(0.1)
+
+
+def start_servers(args) -> list[subprocess.Popen]:
+    mock = subprocess.Popen(
+        [
+            sys.executable, str(BENCHMARKS_DIR / "mock_vapi.py"),
+            "--port", str(args.mock_port),
+            "--latency-ms", str(args.vapi_latency_ms),
+            "--jitter-ms", str(args.vapi_jitter_ms),
+            "--error-rate", str(args.vapi_error_rate),
+            "--rate-limit", str(args.vapi_rate_limit),
+            "--retry-after", str(args.vapi_retry_after),
+        ],
+    )
+
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(BACKEND_SRC), env.get("PYTHONPATH")])),
+        "VAPI_API_KEY": "benchmark",
+        "VAPI_PHONE_NUMBER_ID": "benchmark",
+        "VAPI_CALL_URL": f"http://127.0.0.1:{args.mock_port}/call",
+        "VAPI_MAX_CONCURRENT_CALLS": str(args.max_concurrent_calls),
+        "VAPI_CALLS_PER_SECOND": str(args.calls_per_second),
+        "STATE_DB_PATH": args.state_db,
+        # Every population size sends the same alert; each one must fan out
+        "ALERT_DEDUPE_WINDOW_SECONDS": "0",
+        # Keep organizer numbers out of the recipient counts
+        "VYOM_PHONE_NUMBER": "",
+        "TONY_PHONE_NUMBER": "",
+    })
+    backend = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "backend:app",
+            "--port", str(args.port), "--workers", str(args.workers),
+            "--log-level", "warning", "--no-access-log",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL if args.quiet_backend else None,
+    )
+    return [mock, backend]
+
+
+async def register_users(client: httpx.AsyncClient, start: int, stop: int, concurrency: int, user_ids: list[str]) -> dict:
+    async def request(i: int) -> httpx.Response:
+        index = start + i
+        response = await client.post("/register", json={
+            "full_name": f"Benchmark User {index}",
+            "phone_number": f"+1555{index:07d}",
+        })
+        if response.status_code == 200:
+            user_ids.append(response.json()["user_id"])
+        return response
+
+    return await run_concurrent(stop - start, concurrency, request)
+
+
+async def ingest_locations(client: httpx.AsyncClient, user_ids: list[str], rounds: int, concurrency: int) -> dict:
+    async def request(i: int) -> httpx.Response:
+        step = i // len(user_ids)
+        return await client.post("/location", json={
+            "user_id": user_ids[i % len(user_ids)],
+            "latitude": 37.7749 + (i % 1000) * 1e-5 + step * 2e-5,
+            "longitude": -122.4194 + (i // 1000 % 1000) * 1e-5,
+            "accuracy": 5.0,
+        })
+
+    return await run_concurrent(len(user_ids) * rounds, concurrency, request)
+
+
+async def read_locations(client: httpx.AsyncClient, samples: int) -> dict:
+    latencies = []
+    size = 0
+    started = time.perf_counter()
+    for _ in range(samples):
+        request_started = time.perf_counter()
+        response = await client.get("/locations")
+        latencies.append(time.perf_counter() - request_started)
+        size = len(response.content)
+    result = summarize(latencies, time.perf_counter() - started)
+    result["response_bytes"] = size
+    return result
+
+
+async def fan_out_alert(base_url: str, mock: httpx.AsyncClient, event_slug: str, timeout: float) -> dict:
+    await mock.post("/stats/reset")
+    alert = {
+        "event_name": "Benchmark alert",
+        "description": "Please move to the nearest exit",
+        "urgency": "critical",
+    }
+    if event_slug:
+        alert["event_slug"] = event_slug
+
+    # Alert jobs live in the worker that accepted them: poll over the same connection
+    limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        response = await client.post("/alert", json=alert)
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+
+        deadline = time.monotonic() + timeout
+        while True:
+            status = (await client.get(f"/alert/{job_id}", params={"include_outcomes": "false"})).json()
+            if status["status"] in ("completed", "failed") or time.monotonic() > deadline:
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+    prompt_report = status.get("prompt_report") or {}
+    return {
+        "recipients": status["total_recipients"],
+        "status": status["status"],
+        "seconds": round(elapsed, 3),
+        "time_to_last_call_seconds": status["time_to_last_call_seconds"],
+        "calls_per_second": round(status["total_recipients"] / elapsed, 1) if elapsed > 0 else None,
+        "succeeded": status["succeeded"],
+        "failed": status["failed"],
+        "prompt_tokens": prompt_report.get("prompt_tokens"),
+        "vapi": (await mock.get("/stats")).json(),
+    }
+
+
+async def run_benchmarks(args) -> list[dict]:
+    results = []
+    user_ids: list[str] = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    base_url = f"http://127.0.0.1:{args.port}"
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client, \
+            httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.mock_port}") as mock:
+        for size in args.sizes:
+            print(f"Population {size}...", file=sys.stderr)
+            result = {"population": size}
+            result["register"] = await register_users(client, len(user_ids), size, args.concurrency, user_ids)
+            result["location_ingest"] = await ingest_locations(client, user_ids, args.location_rounds, args.concurrency)
+            result["locations_read"] = await read_locations(client, args.read_samples)
+            if not args.skip_alerts:
+                result["alert_fan_out"] = await fan_out_alert(base_url, mock, args.event_slug, args.alert_timeout)
+            results.append(result)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backend against a local VAPI stand-in")
+    parser.add_argument("--sizes", default="100,1000,5000", help="comma-separated population sizes, ascending")
+    parser.add_argument("--concurrency", type=int, default=32, help="outstanding client requests")
+    parser.add_argument("--location-rounds", type=int, default=3, help="location updates per user per size")
+    parser.add_argument("--read-samples", type=int, default=20, help="GET /locations requests per size")
+    parser.add_argument("--skip-alerts", action="store_true")
+    parser.add_argument("--event-slug", default="xai-vercel-hackathon", help="FAQ used for alerts (empty for none)")
+    parser.add_argument("--alert-timeout", type=float, default=600.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mock-port", type=int, default=9010)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes (more than one needs --state-db)")
+    parser.add_argument("--max-concurrent-calls", type=int, default=20)
+    parser.add_argument("--calls-per-second", type=float, default=0, help="backend call pacing (0 disables)")
+    parser.add_argument("--state-db", default="", help="STATE_DB_PATH for the backend (empty keeps state in memory)")
+    parser.add_argument("--vapi-latency-ms", type=float, default=50.0)
+    parser.add_argument("--vapi-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--vapi-error-rate", type=float, default=0.0)
+    parser.add_argument("--vapi-rate-limit", type=float, default=0.0, help="mock calls per second before 429s (0 disables)")
+    parser.add_argument("--vapi-retry-after", type=float, default=1.0)
+    parser.add_argument("--quiet-backend", action="store_true", help="discard backend stdout")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+    args.sizes = sorted(int(size) for size in args.sizes.split(",") if size)
+    if args.workers > 1 and not args.state_db:
+        parser.error("--workers above 1 needs a shared --state-db")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    servers = start_servers(args)
+    try:
+        async def run():
+            await wait_until_up(f"http://127.0.0.1:{args.mock_port}/stats")
+            await wait_until_up(f"http://127.0.0.1:{args.port}/health")
+            return await run_benchmarks(args)
+
+        results = asyncio.run(run())
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.wait()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
+import asyncio
+import json
 import os
+import sqlite3
+import time
 import uuid
-from datetime import datetime
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Dict, Literal, Optional, Set, Tuple
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import ValidationError
 
-from .models import AlertRequest, AlertResponse, UserRegistration, RegisteredUser, RegistrationResponse, LocationUpdate, UserLocation, LocationResponse
+from .alert_jobs import AlertJob, AlertJobRunner, DEFAULT_DEDUPE_WINDOW_SECONDS, IdempotencyConflict, alert_fingerprint
+from .location_feed import LocationFeed
+from .location_stream import BoundingBox, LocationBroadcaster
+from .metrics import CONTENT_TYPE, LOCATION_UPDATES, REGISTRY, Gauge, MetricsMiddleware
+from .models import AlertRequest, AlertJobResponse, AlertJobStatus, UserRegistration, RegisteredUser, RegistrationResponse, LocationUpdate, UserLocation, LocationResponse, LocationBatchItemResult, LocationBatchResponse
+from .persistence import DEFAULT_SYNC_INTERVAL_SECONDS, AlertClaim, DuplicatePhoneNumber, SQLiteStateStore, StateBackend, StateChanges, fingerprint_digest
+from .spatial import GridIndex, distance_to_polygon_edge_m, point_in_polygon, polygon_bbox
+from .tracks import DEFAULT_TRACK_CAPACITY, TrackStore, simplify_track
 from .voice_alerts import VoiceAlertService
 
 load_dotenv()
@@ -23,29 +36,294 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Outermost, so request latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # In-memory user storage
 registered_users: Dict[str, RegisteredUser] = {}
 
+# Phone number -> user id, kept in step with registered_users
+phone_index: Dict[str, str] = {}
+
+# Append-only registration order for cursor pagination; removed ids are skipped
+user_order: list[str] = []
+
+USER_FIELDS = tuple(RegisteredUser.model_fields)
+USERS_STREAM_CHUNK = 500
+
 # In-memory location storage
 user_locations: Dict[str, UserLocation] = {}
 
+# Grid index over user_locations for radius and bounding-box queries
+location_index = GridIndex()
+
+# Bounded per-user location history
+location_tracks = TrackStore(int(os.getenv("LOCATION_HISTORY_CAPACITY", DEFAULT_TRACK_CAPACITY)))
+
+# Change sequence and offline expiry over user_locations
+location_changes = LocationFeed(user_locations)
+
+
+def _serialize_location(loc: UserLocation) -> dict:
+    """Render a location for the admin dashboard"""
+    return {
+        "user_id": loc.user_id,
+        "user_name": loc.user_name,
+        "phone_number": loc.phone_number,
+        "latitude": loc.latitude,
+        "longitude": loc.longitude,
+        "accuracy": loc.accuracy,
+        "last_updated": loc.last_updated.isoformat(),
+        "status": loc.status
+    }
+
+
+# Pushes location changes to streaming admin dashboards
+location_broadcaster = LocationBroadcaster(
+    user_locations, _serialize_location, format_cursor=location_changes.cursor
+)
+location_changes.add_listener(location_broadcaster.publish)
+
+# State sizes are read when /metrics is scraped
+REGISTRY.register(Gauge("aegis_registered_users", "Registered users", function=lambda: len(registered_users)))
+REGISTRY.register(Gauge("aegis_user_locations", "Users with a known location", function=lambda: len(user_locations)))
+REGISTRY.register(Gauge("aegis_location_stream_subscribers", "Open location stream connections", function=lambda: len(location_broadcaster)))
+
+_single_location_applied = LOCATION_UPDATES.labels("location", "applied")
+_single_location_superseded = LOCATION_UPDATES.labels("location", "superseded")
+_single_location_rejected = LOCATION_UPDATES.labels("location", "rejected")
+
 # Configuration - keep existing hardcoded numbers for backward compatibility
 HARDCODED_PHONE_NUMBERS = [
     os.environ.get("VYOM_PHONE_NUMBER", ""),
     os.environ.get("TONY_PHONE_NUMBER", ""),
 ]
+_hardcoded_numbers = {n for n in HARDCODED_PHONE_NUMBERS if n}
+
+# Every number an alert goes to, maintained on register and unregister
+recipient_numbers: Set[str] = set(_hardcoded_numbers)
+
+# Upper bound on updates accepted by one /locations/batch request
+MAX_LOCATION_BATCH = 5000
+# and on its body, checked while reading so an oversized batch is never buffered whole
+MAX_LOCATION_BATCH_BYTES = MAX_LOCATION_BATCH * 1024
+
+# Assumed attendee walking speed, used to widen a target area for stale fixes
+ASSUMED_WALKING_SPEED_MPS = 1.4
 
 # Initialize service
 voice_service = None
+alert_runner = None
+expiry_task = None
+faq_refresh_task = None
+
+# Durable storage for registered_users and user_locations; empty STATE_DB_PATH disables it.
+# Workers sharing one store follow each other's writes from state_cursor on.
+state_store: Optional[StateBackend] = None
+state_cursor = 0
+_state_sync_lock = asyncio.Lock()
+flush_task = None
+sync_task = None
+alert_status_task = None
+
+
+def _restore_state(store: StateBackend):
+    """Rebuild the in-memory maps and their indexes from durable storage"""
+    global state_cursor
+    started = time.monotonic()
+    # Read first: changes made while loading are replayed by the next sync
+    state_cursor = store.cursor()
+    for user in store.load_users():
+        _add_user(user)
+
+    restored_locations = 0
+    for location in store.load_locations():
+        # A location can outlive its user if a commit raced an unregister
+        if location.user_id not in registered_users:
+            continue
+        user_locations[location.user_id] = location
+        location_index.update(location.user_id, location.latitude, location.longitude)
+        location_changes.touch(location.user_id)
+        restored_locations += 1
+
+    print(f"Restored {len(registered_users)} users and {restored_locations} locations in {time.monotonic() - started:.2f}s")
+
+
+def _apply_state_changes(changes: StateChanges):
+    """Bring the in-memory maps up to date with writes made by other workers"""
+    if changes.full:
+        known = {user.id for user in changes.users}
+        for user_id in [user_id for user_id in registered_users if user_id not in known]:
+            _remove_user(user_id)
+    for user_id in changes.removed_user_ids:
+        _remove_user(user_id)
+
+    for user in changes.users:
+        if user.id in registered_users:
+            registered_users[user.id] = user
+            continue
+        # A number we still map to someone else was freed and re-registered elsewhere
+        stale_id = phone_index.get(user.phone_number)
+        if stale_id is not None:
+            _remove_user(stale_id)
+        _add_user(user)
+
+    for location in changes.locations:
+        if location.user_id not in registered_users:
+            continue
+        current = user_locations.get(location.user_id)
+        if current is not None and current.last_updated >= location.last_updated:
+            continue
+        user_locations[location.user_id] = location
+        location_index.update(location.user_id, location.latitude, location.longitude)
+        location_changes.touch(location.user_id)
+        location_tracks.record(
+            location.user_id,
+            int(location.last_updated.replace(tzinfo=timezone.utc).timestamp()),
+            location.latitude,
+            location.longitude,
+            location.accuracy,
+        )
+
+
+async def _sync_state():
+    """Apply other workers' writes to the shared store, if there is one"""
+    global state_cursor
+    if not state_store:
+        return
+    async with _state_sync_lock:
+        changes = await asyncio.to_thread(state_store.changes_since, state_cursor)
+        _apply_state_changes(changes)
+        state_cursor = changes.cursor
+
+
+async def run_state_sync(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await _sync_state()
+        except Exception as e:
+            print(f"Failed to sync state: {e}")
+
+
+async def _find_user(user_id: str) -> Optional[RegisteredUser]:
+    """Look a user up, syncing once in case they registered through another worker"""
+    user = registered_users.get(user_id)
+    if user is None and state_store:
+        await _sync_state()
+        user = registered_users.get(user_id)
+    return user
+
+
+async def _claim_alert(
+    alert: AlertRequest, job_id: str, recipients: int, idempotency_key: Optional[str]
+) -> Optional[AlertClaim]:
+    """Claim an alert in shared state so that only one worker dispatches it"""
+    if not state_store or not alert_runner:
+        return None
+    try:
+        return await asyncio.to_thread(
+            state_store.claim_alert,
+            job_id,
+            alert_fingerprint(alert),
+            recipients,
+            idempotency_key,
+            alert_runner.dedupe_window,
+        )
+    except Exception as e:
+        print(f"Failed to claim alert in shared state, deduplicating in this worker only: {e}")
+        return None
+
+
+async def _release_alert_claim(job: AlertJob) -> None:
+    """Let identical alerts be sent again once a job has finished"""
+    if state_store:
+        await asyncio.to_thread(state_store.release_alert, job.id)
+
+
+async def _publish_alert_statuses(jobs: list[AlertJob]) -> None:
+    """Share alert job progress so any worker can answer GET /alert/{job_id}"""
+    if not state_store or not jobs:
+        return
+    try:
+        await asyncio.to_thread(
+            state_store.save_alert_statuses, [job.to_status(include_outcomes=False) for job in jobs]
+        )
+    except Exception as e:
+        print(f"Failed to publish alert job status: {e}")
+
+
+async def run_alert_status_publisher(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        if alert_runner:
+            await _publish_alert_statuses(
+                [job for job in alert_runner.jobs.values() if job.status == "running"]
+            )
+
+
+async def _alert_job_finished(job: AlertJob) -> None:
+    await _publish_alert_statuses([job])
+    await _release_alert_claim(job)
 
 
 @app.on_event("startup")
 async def startup_event():
-    global voice_service
+    global voice_service, alert_runner, expiry_task, faq_refresh_task, state_store, flush_task, sync_task, alert_status_task
+    db_path = os.getenv("STATE_DB_PATH", "aegis_state.db")
+    if db_path:
+        try:
+            state_store = SQLiteStateStore(db_path)
+        except (sqlite3.Error, OSError) as e:
+            # e.g. a read-only deployment filesystem
+            print(f"State store unavailable at {db_path}, keeping state in memory only: {e}")
+    if state_store:
+        _restore_state(state_store)
+        flush_task = asyncio.create_task(state_store.run_flusher())
+        sync_interval = float(os.getenv("STATE_SYNC_INTERVAL_SECONDS", DEFAULT_SYNC_INTERVAL_SECONDS))
+        if sync_interval > 0:
+            sync_task = asyncio.create_task(run_state_sync(sync_interval))
+
+    expiry_task = asyncio.create_task(location_changes.run_expiry())
+
     try:
         voice_service = VoiceAlertService()
     except ValueError as e:
         print(f"Voice service initialization failed: {e}")
+        return
+
+    # Keep event FAQs in memory so alert dispatch never reads from disk
+    voice_service.faq_loader.preload()
+    faq_refresh_task = asyncio.create_task(voice_service.faq_loader.run_refresher())
+
+    alert_runner = AlertJobRunner(
+        voice_service,
+        dedupe_window=float(os.getenv("ALERT_DEDUPE_WINDOW_SECONDS", DEFAULT_DEDUPE_WINDOW_SECONDS)),
+        on_finished=_alert_job_finished,
+    )
+    if state_store:
+        alert_status_task = asyncio.create_task(run_alert_status_publisher(state_store.flush_interval))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if expiry_task:
+        expiry_task.cancel()
+    if faq_refresh_task:
+        faq_refresh_task.cancel()
+    if alert_status_task:
+        alert_status_task.cancel()
+    if alert_runner:
+        await alert_runner.stop()
+    if voice_service:
+        await voice_service.aclose()
+    if flush_task:
+        flush_task.cancel()
+    if sync_task:
+        sync_task.cancel()
+    if state_store:
+        await state_store.flush()
+        state_store.close()
 
 
 @app.get("/")
@@ -55,20 +333,98 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    all_phone_numbers = get_all_phone_numbers()
     return {
         "status": "healthy",
         "registered_users": len(registered_users),
-        "total_phone_numbers": len(all_phone_numbers),
-        "hardcoded_numbers": len([n for n in HARDCODED_PHONE_NUMBERS if n]),
+        "total_phone_numbers": len(recipient_numbers),
+        "hardcoded_numbers": len(_hardcoded_numbers),
         "voice_service": voice_service is not None,
+        "persistence": state_store is not None,
     }
 
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 def get_all_phone_numbers():
     """Get all phone numbers from registered users plus hardcoded numbers"""
-    user_numbers = [user.phone_number for user in registered_users.values()]
-    hardcoded_numbers = [n for n in HARDCODED_PHONE_NUMBERS if n]
-    return list(set(user_numbers + hardcoded_numbers))
+    return list(recipient_numbers)
+
+def get_geofenced_phone_numbers(alert: AlertRequest):
+    """
+    Get phone numbers of users in the alert's target area, those inside it first
+
+    A user just outside the area is still called if their last fix is old or
+    imprecise enough that they may have been inside it: the allowance is the
+    distance they could have walked since the fix plus its GPS accuracy,
+    capped at alert.stale_allowance_m. Hardcoded organizer numbers are
+    always called, last.
+    """
+    now = datetime.utcnow()
+    cap = alert.stale_allowance_m
+    inside: Set[str] = set()
+    near: Dict[str, float] = {}
+
+    def consider(user_id: str, outside_m: float):
+        if outside_m <= 0:
+            inside.add(user_id)
+            return
+        loc = user_locations[user_id]
+        age = max(0.0, (now - loc.last_updated).total_seconds())
+        allowance = min(cap, age * ASSUMED_WALKING_SPEED_MPS + (loc.accuracy or 0))
+        if outside_m <= allowance:
+            near[user_id] = min(outside_m, near.get(user_id, outside_m))
+
+    if alert.target_circle:
+        circle = alert.target_circle
+        for user_id, distance in location_index.within_radius(
+            circle.latitude, circle.longitude, circle.radius_m + cap
+        ):
+            consider(user_id, distance - circle.radius_m)
+
+    if alert.target_polygon:
+        vertices = [(p.latitude, p.longitude) for p in alert.target_polygon.points]
+        for user_id in location_index.within_bbox(*polygon_bbox(vertices, cap)):
+            position = location_index.position(user_id)
+            if position is None:
+                continue
+            lat, lon = position
+            if point_in_polygon(lat, lon, vertices):
+                consider(user_id, 0)
+            else:
+                consider(user_id, distance_to_polygon_edge_m(lat, lon, vertices))
+
+    ordered = list(inside) + sorted(
+        (user_id for user_id in near if user_id not in inside), key=near.__getitem__
+    )
+    phone_numbers = [user_locations[user_id].phone_number for user_id in ordered]
+    selected = set(phone_numbers)
+    phone_numbers.extend(n for n in _hardcoded_numbers if n not in selected)
+    return phone_numbers
+
+def _add_user(user: RegisteredUser):
+    """Store a user and index their phone number"""
+    registered_users[user.id] = user
+    phone_index[user.phone_number] = user.id
+    user_order.append(user.id)
+    recipient_numbers.add(user.phone_number)
+
+def _remove_user(user_id: str) -> Optional[RegisteredUser]:
+    """Remove a user, their phone number index entry and their location"""
+    user = registered_users.pop(user_id, None)
+    if user is None:
+        return None
+
+    phone_index.pop(user.phone_number, None)
+    if user.phone_number not in _hardcoded_numbers:
+        recipient_numbers.discard(user.phone_number)
+    if user_locations.pop(user_id, None):
+        location_index.remove(user_id)
+        location_changes.remove(user_id)
+    location_tracks.remove(user_id)
+    return user
 
 @app.post("/register", response_model=RegistrationResponse)
 async def register_user(registration: UserRegistration):
@@ -77,9 +433,8 @@ async def register_user(registration: UserRegistration):
     """
     try:
         # Check if phone number already exists
-        for user in registered_users.values():
-            if user.phone_number == registration.phone_number:
-                raise HTTPException(status_code=400, detail="Phone number already registered")
+        if registration.phone_number in phone_index:
+            raise HTTPException(status_code=400, detail="Phone number already registered")
         
         # Create new user
         user_id = str(uuid.uuid4())
@@ -95,8 +450,18 @@ async def register_user(registration: UserRegistration):
             registered_at=datetime.utcnow()
         )
         
-        # Store in memory
-        registered_users[user_id] = registered_user
+        # Store in memory, then durably; the store enforces unique numbers across workers
+        _add_user(registered_user)
+        if state_store:
+            try:
+                async with _state_sync_lock:
+                    await asyncio.to_thread(state_store.save_user, registered_user)
+            except DuplicatePhoneNumber:
+                _remove_user(user_id)
+                raise HTTPException(status_code=400, detail="Phone number already registered")
+            except Exception:
+                _remove_user(user_id)
+                raise
         
         return RegistrationResponse(
             success=True,
@@ -109,49 +474,249 @@ async def register_user(registration: UserRegistration):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
+def _serialize_user(user: RegisteredUser, fields: Tuple[str, ...]) -> dict:
+    """Render the requested fields of a user"""
+    data = {}
+    for field in fields:
+        value = getattr(user, field)
+        data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
 @app.get("/users")
-async def list_users():
+async def list_users(
+    limit: Optional[int] = Query(None, ge=1, le=10_000, description="Page size; omit to stream every user"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to include, e.g. id,full_name,phone_number"),
+    format: Literal["json", "ndjson"] = Query("json"),
+):
     """
-    Get all registered users with full details for admin dashboard
+    Get registered users for admin dashboard
+
+    Users come in registration order and are streamed in chunks, so the
+    response is never built in memory at once. `fields` limits each user to
+    the listed attributes (sensitive ones such as medical_information are
+    only sent when asked for, or when `fields` is omitted). With `limit`,
+    pass the returned `next_cursor` to fetch the following page. In NDJSON
+    mode each line is one user, followed by a `{"next_cursor": ...}` line
+    when more users remain.
     """
-    return {
-        "total_users": len(registered_users),
-        "users": [
-            {
-                "id": user.id,
-                "full_name": user.full_name,
-                "phone_number": user.phone_number,
-                "age": user.age,
-                "gender": user.gender,
-                "medical_information": user.medical_information,
-                "emergency_contact": user.emergency_contact,
-                "id_information": user.id_information,
-                "registered_at": user.registered_at.isoformat()
-            }
-            for user in registered_users.values()
-        ],
-        "hardcoded_numbers": [n for n in HARDCODED_PHONE_NUMBERS if n]
-    }
+    if fields:
+        selected = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [f for f in selected if f not in USER_FIELDS]
+        if unknown or not selected:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(USER_FIELDS)}")
+    else:
+        selected = USER_FIELDS
+
+    try:
+        start = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if start < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Registrations during the stream land beyond this snapshot of the order
+    end = len(user_order)
+    total_users = len(registered_users)
+    hardcoded_numbers = [n for n in HARDCODED_PHONE_NUMBERS if n]
+
+    async def generate():
+        position = start
+        emitted = 0
+        chunk = []
+
+        if format == "json":
+            yield f'{{"total_users": {total_users}, "users": ['
+
+        while position < end and (limit is None or emitted < limit):
+            user = registered_users.get(user_order[position])
+            position += 1
+            if user is None:
+                continue
 
+            line = json.dumps(_serialize_user(user, selected))
+            if format == "json":
+                chunk.append(line if emitted == 0 else "," + line)
+            else:
+                chunk.append(line + "\n")
+            emitted += 1
 
-@app.post("/alert", response_model=AlertResponse)
-async def send_alert(alert: AlertRequest):
+            if len(chunk) >= USERS_STREAM_CHUNK:
+                yield "".join(chunk)
+                chunk = []
+                # Let other requests run between chunks
+                await asyncio.sleep(0)
+
+        if chunk:
+            yield "".join(chunk)
+
+        # Skip past removed users so an exhausted list yields no cursor
+        while position < end and user_order[position] not in registered_users:
+            position += 1
+        next_cursor = str(position) if position < end else None
+
+        if format == "json":
+            yield f'], "hardcoded_numbers": {json.dumps(hardcoded_numbers)}, "next_cursor": {json.dumps(next_cursor)}}}'
+        elif next_cursor is not None:
+            yield json.dumps({"next_cursor": next_cursor}) + "\n"
+
+    media_type = "application/json" if format == "json" else "application/x-ndjson"
+    return StreamingResponse(generate(), media_type=media_type)
+
+
+@app.delete("/users/{user_id}", response_model=RegistrationResponse)
+async def unregister_user(user_id: str):
+    """
+    Unregister a user so they no longer receive alerts
+    """
+    user = await _find_user(user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    # A sync during the lookup may already have removed them
+    _remove_user(user_id)
+    if state_store:
+        await asyncio.to_thread(state_store.delete_user, user_id)
+
+    return RegistrationResponse(
+        success=True,
+        message=f"User {user.full_name} unregistered successfully",
+        user_id=user_id
+    )
+
+
+@app.post("/alert", response_model=AlertJobResponse, status_code=202)
+async def send_alert(
+    alert: AlertRequest,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+):
     """
-    Send an event alert via voice call to all registered phone numbers
+    Queue an event alert for voice call delivery to all registered phone numbers,
+    or only to users in the alert's target area when one is given
+
+    A retry with the same Idempotency-Key header, or an identical alert sent
+    while the first is still being dispatched, returns the original job
+    instead of calling everyone again. With a shared state store this holds
+    across workers.
     """
+    if not voice_service or not alert_runner:
+        raise HTTPException(
+            status_code=500,
+            detail="Voice service not available - check VAPI credentials",
+        )
+
     try:
-        if not voice_service:
-            raise HTTPException(
-                status_code=500,
-                detail="Voice service not available - check VAPI credentials",
-            )
+        existing = alert_runner.find_duplicate(alert, idempotency_key)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if existing is not None:
+        print(f"Coalesced duplicate alert '{alert.event_name}' into job {existing.id}")
+        return AlertJobResponse(
+            success=True,
+            message=f"Alert already queued for {len(existing.outcomes)} recipients",
+            job_id=existing.id,
+            recipients_queued=len(existing.outcomes),
+            duplicate=True,
+        )
+
+    # Include users and locations that reached other workers
+    try:
+        await _sync_state()
+    except Exception as e:
+        print(f"Failed to sync state before alert, using local state: {e}")
+
+    try:
+        if alert.is_geofenced:
+            phone_numbers = get_geofenced_phone_numbers(alert)
+        else:
+            phone_numbers = get_all_phone_numbers()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to send alert: {str(e)}")
 
-        all_phone_numbers = get_all_phone_numbers()
-        return await voice_service.send_call_alerts(alert, all_phone_numbers)
+    # Another worker may already be dispatching this alert
+    job_id = str(uuid.uuid4())
+    claim = await _claim_alert(alert, job_id, len(phone_numbers), idempotency_key)
+    if claim is not None:
+        if claim.kind == "key" and claim.fingerprint != fingerprint_digest(alert_fingerprint(alert)):
+            raise HTTPException(status_code=422, detail="Idempotency key was already used for a different alert")
+        print(f"Coalesced duplicate alert '{alert.event_name}' into job {claim.job_id}")
+        return AlertJobResponse(
+            success=True,
+            message=f"Alert already queued for {claim.recipients} recipients",
+            job_id=claim.job_id,
+            recipients_queued=claim.recipients,
+            duplicate=True,
+        )
+
+    try:
+        job, created = alert_runner.submit(alert, phone_numbers, idempotency_key, job_id)
+        if created:
+            await _publish_alert_statuses([job])
+        return AlertJobResponse(
+            success=True,
+            message=f"Alert queued for {len(job.outcomes)} recipients",
+            job_id=job.id,
+            recipients_queued=len(job.outcomes),
+            duplicate=not created,
+        )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send alert: {str(e)}")
 
+@app.get("/alert/{job_id}", response_model=AlertJobStatus)
+async def get_alert_status(job_id: str, include_outcomes: bool = True):
+    """
+    Report progress of a submitted alert, optionally with per-number outcomes
+
+    A job another worker is running is reported from shared state, as of
+    that worker's last update and without per-number outcomes.
+    """
+    job = alert_runner.get(job_id) if alert_runner else None
+    if job:
+        return job.to_status(include_outcomes=include_outcomes)
+
+    status = await asyncio.to_thread(state_store.load_alert_status, job_id) if state_store else None
+    if not status:
+        raise HTTPException(status_code=404, detail="Alert job not found")
+    return status
+
+def _fix_time(location: LocationUpdate, now: datetime) -> datetime:
+    """When a fix was taken, never later than its receipt"""
+    if location.recorded_at is None:
+        return now
+    return min(location.recorded_at, now)
+
+def _record_fix(location: LocationUpdate, recorded_at: datetime):
+    """Add a fix to the user's location history"""
+    location_tracks.record(
+        location.user_id,
+        int(recorded_at.replace(tzinfo=timezone.utc).timestamp()),
+        location.latitude,
+        location.longitude,
+        location.accuracy,
+    )
+
+def _store_location(user: RegisteredUser, location: LocationUpdate, recorded_at: datetime) -> bool:
+    """Make a fix the user's current location unless a newer one is already stored"""
+    current = user_locations.get(user.id)
+    if current is not None and current.last_updated > recorded_at:
+        return False
+
+    user_locations[user.id] = UserLocation(
+        user_id=user.id,
+        user_name=user.full_name,
+        phone_number=user.phone_number,
+        latitude=location.latitude,
+        longitude=location.longitude,
+        accuracy=location.accuracy,
+        last_updated=recorded_at,
+        status="online"
+    )
+    location_index.update(user.id, location.latitude, location.longitude)
+    location_changes.touch(user.id)
+    if state_store:
+        state_store.queue_location(user_locations[user.id])
+    return True
+
 @app.post("/location", response_model=LocationResponse)
 async def update_user_location(location: LocationUpdate):
     """
@@ -159,26 +724,21 @@ async def update_user_location(location: LocationUpdate):
     """
     try:
         # Check if user exists
-        if location.user_id not in registered_users:
+        user = await _find_user(location.user_id)
+        if user is None:
+            _single_location_rejected.inc()
             raise HTTPException(status_code=404, detail="User not found")
         
-        user = registered_users[location.user_id]
-        
-        # Create or update location record
-        user_location = UserLocation(
-            user_id=location.user_id,
-            user_name=user.full_name,
-            phone_number=user.phone_number,
-            latitude=location.latitude,
-            longitude=location.longitude,
-            accuracy=location.accuracy,
-            last_updated=datetime.utcnow(),
-            status="online"
-        )
-        
-        # Store in memory
-        user_locations[location.user_id] = user_location
+        recorded_at = _fix_time(location, datetime.utcnow())
+        _record_fix(location, recorded_at)
+        if not _store_location(user, location, recorded_at):
+            _single_location_superseded.inc()
+            return LocationResponse(
+                success=True,
+                message=f"Ignored location older than the latest for {user.full_name}"
+            )
         
+        _single_location_applied.inc()
         print(f"📍 Location updated for {user.full_name}: {location.latitude}, {location.longitude}")
         
         return LocationResponse(
@@ -191,31 +751,239 @@ async def update_user_location(location: LocationUpdate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update location: {str(e)}")
 
+@app.post("/locations/batch", response_model=LocationBatchResponse)
+async def update_user_locations_batch(request: Request):
+    """
+    Apply many location updates, from one or many devices, in one request
+
+    The body is a JSON array of location updates, or one update per line when
+    sent as application/x-ndjson. Every valid fix is added to the user's
+    history; each user's newest fix becomes their location and older fixes in
+    the same batch are reported as superseded.
+    """
+    too_large = HTTPException(status_code=413, detail=f"Batch body exceeds {MAX_LOCATION_BATCH_BYTES} bytes")
+    try:
+        declared = int(request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+    if declared > MAX_LOCATION_BATCH_BYTES:
+        raise too_large
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_LOCATION_BATCH_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    body = b"".join(chunks)
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+
+    if ndjson:
+        items = [line for line in body.splitlines() if line.strip()]
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of location updates")
+
+    if len(items) > MAX_LOCATION_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_LOCATION_BATCH} updates")
+
+    now = datetime.utcnow()
+    results: list[LocationBatchItemResult] = []
+    newest: Dict[str, Tuple[int, LocationUpdate, datetime]] = {}
+    synced = False
+
+    # Validate every item, keeping only each user's newest fix to apply
+    for index, item in enumerate(items):
+        try:
+            location = LocationUpdate.model_validate_json(item) if ndjson else LocationUpdate.model_validate(item)
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'body'}: {err['msg']}" for err in e.errors())
+            results.append(LocationBatchItemResult(index=index, status="rejected", error=error))
+            continue
+
+        if location.user_id not in registered_users and not synced:
+            # Catch up once in case users registered through another worker
+            synced = True
+            await _sync_state()
+        if location.user_id not in registered_users:
+            results.append(LocationBatchItemResult(index=index, user_id=location.user_id, status="rejected", error="User not found"))
+            continue
+
+        recorded_at = _fix_time(location, now)
+        try:
+            _record_fix(location, recorded_at)
+        except (ValueError, OverflowError) as e:
+            results.append(LocationBatchItemResult(index=index, user_id=location.user_id, status="rejected", error=str(e)))
+            continue
+        results.append(LocationBatchItemResult(index=index, user_id=location.user_id, status="superseded"))
+        best = newest.get(location.user_id)
+        if best is None or recorded_at >= best[2]:
+            newest[location.user_id] = (index, location, recorded_at)
+
+    for index, location, recorded_at in newest.values():
+        try:
+            if _store_location(registered_users[location.user_id], location, recorded_at):
+                results[index].status = "applied"
+        except Exception as e:
+            # One bad fix must not cost the rest of the batch
+            results[index].status = "rejected"
+            results[index].error = str(e)
+
+    counts = {"applied": 0, "superseded": 0, "rejected": 0}
+    for result in results:
+        counts[result.status] += 1
+    for status, count in counts.items():
+        LOCATION_UPDATES.labels("locations_batch", status).inc(count)
+
+    print(f"📍 Batch location update: {counts['applied']} applied, {counts['superseded']} superseded, {counts['rejected']} rejected")
+
+    return LocationBatchResponse(
+        success=counts["rejected"] < len(results) or not results,
+        results=results,
+        **counts
+    )
+
 @app.get("/locations")
-async def get_all_locations():
+async def get_all_locations(since: Optional[str] = Query(None, max_length=64)):
     """
-    Get all user locations for admin dashboard
+    Get user locations for admin dashboard
+
+    With `since`, only locations that changed (moved or went offline) after
+    that cursor are returned, plus the ids of removed locations. Pass the
+    returned `cursor` on the next poll. A cursor from another process, such
+    as one from before a restart, yields a full snapshot flagged with `full`.
     """
-    # Mark users as offline if they haven't updated location in 5 minutes
-    cutoff_time = datetime.utcnow()
-    for location in user_locations.values():
-        time_diff = cutoff_time - location.last_updated
-        if time_diff.total_seconds() > 300:  # 5 minutes
-            location.status = "offline"
-    
+    # Users go offline after 5 minutes without a location update
+    location_changes.expire()
+
+    since_seq = location_changes.parse_cursor(since) if since is not None else None
+    if since_seq is None:
+        return {
+            "cursor": location_changes.cursor(),
+            "full": True,
+            "total_locations": len(user_locations),
+            "locations": [_serialize_location(loc) for loc in user_locations.values()],
+            "removed": []
+        }
+
+    changed, removed = location_changes.changes_since(since_seq)
     return {
+        "cursor": location_changes.cursor(),
+        "full": False,
         "total_locations": len(user_locations),
+        "locations": [_serialize_location(loc) for loc in changed],
+        "removed": removed
+    }
+
+@app.get("/locations/nearby")
+async def get_nearby_locations(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(500, gt=0, le=100_000),
+):
+    """
+    Get user locations within radius_m meters of a point, nearest first
+    """
+    location_changes.expire()
+    matches = location_index.within_radius(lat, lon, radius_m)
+    return {
+        "total_locations": len(matches),
         "locations": [
+            {**_serialize_location(user_locations[user_id]), "distance_m": round(distance, 1)}
+            for user_id, distance in matches
+        ]
+    }
+
+@app.get("/locations/bbox")
+async def get_locations_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+):
+    """
+    Get user locations inside a map viewport (min_lon > max_lon crosses the antimeridian)
+    """
+    if min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must not exceed max_lat")
+
+    location_changes.expire()
+    user_ids = location_index.within_bbox(min_lat, min_lon, max_lat, max_lon)
+    return {
+        "total_locations": len(user_ids),
+        "locations": [_serialize_location(user_locations[user_id]) for user_id in user_ids]
+    }
+
+@app.get("/locations/{user_id}/track")
+async def get_user_track(
+    user_id: str,
+    since: Optional[datetime] = Query(None, description="Only fixes at or after this time (UTC)"),
+    max_points: Optional[int] = Query(None, ge=2, le=10_000, description="Downsample to at most this many points"),
+    tolerance_m: float = Query(0, ge=0, le=10_000, description="Drop points deviating less than this from the simplified path"),
+):
+    """
+    Get a user's recent path, optionally downsampled with Douglas-Peucker
+    """
+    if user_id not in registered_users:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    track = location_tracks.get(user_id)
+    since_ts = None
+    if since is not None:
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        since_ts = int(since.timestamp())
+    points = track.points(since_ts) if track else []
+    simplified = simplify_track(points, max_points, tolerance_m)
+
+    return {
+        "user_id": user_id,
+        "total_points": len(points),
+        "returned_points": len(simplified),
+        "points": [
             {
-                "user_id": loc.user_id,
-                "user_name": loc.user_name,
-                "phone_number": loc.phone_number,
-                "latitude": loc.latitude,
-                "longitude": loc.longitude,
-                "accuracy": loc.accuracy,
-                "last_updated": loc.last_updated.isoformat(),
-                "status": loc.status
+                "latitude": lat,
+                "longitude": lon,
+                "accuracy": accuracy,
+                "recorded_at": datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None).isoformat(),
             }
-            for loc in user_locations.values()
+            for timestamp, lat, lon, accuracy in simplified
         ]
     }
+
+@app.get("/locations/stream")
+async def stream_locations(
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180),
+):
+    """
+    Stream location and online/offline changes as Server-Sent Events,
+    optionally limited to a map viewport
+    """
+    bbox: Optional[BoundingBox] = None
+    if min_lat is not None and min_lon is not None and max_lat is not None and max_lon is not None:
+        if min_lat > max_lat:
+            raise HTTPException(status_code=400, detail="min_lat must not exceed max_lat")
+        bbox = (min_lat, min_lon, max_lat, max_lon)
+    elif any(b is not None for b in (min_lat, min_lon, max_lat, max_lon)):
+        raise HTTPException(status_code=400, detail="Bounding box needs min_lat, min_lon, max_lat and max_lon")
+
+    location_changes.expire()
+    subscriber = location_broadcaster.subscribe(bbox)
+    user_ids = location_index.within_bbox(*bbox) if bbox else list(user_locations)
+    snapshot = {
+        "cursor": location_changes.cursor(),
+        "locations": [_serialize_location(user_locations[user_id]) for user_id in user_ids]
+    }
+
+    return StreamingResponse(
+        location_broadcaster.stream(subscriber, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
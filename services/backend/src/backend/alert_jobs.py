@@ -0,0 +1,246 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Literal, Optional, Set, Tuple
+
+from .models import AlertJobStatus, AlertRequest, CallOutcome, FAQPromptReport
+from .voice_alerts import VoiceAlertService
+
+DEFAULT_RETAINED_JOBS = 200
+DEFAULT_DEDUPE_WINDOW_SECONDS = 60.0
+
+
+class IdempotencyConflict(ValueError):
+    """An idempotency key was reused for a different alert"""
+
+
+def alert_fingerprint(alert: AlertRequest) -> str:
+    """Identity of an alert for duplicate detection: its content and target area"""
+    return alert.model_dump_json(
+        include={"event_name", "description", "urgency", "event_slug", "target_circle", "target_polygon"}
+    )
+
+
+class AlertJob:
+    """An alert fan-out and its per-number progress"""
+
+    def __init__(
+        self,
+        alert: AlertRequest,
+        phone_numbers: list[str],
+        idempotency_key: Optional[str] = None,
+        job_id: Optional[str] = None,
+    ):
+        self.id = job_id or str(uuid.uuid4())
+        self.alert = alert
+        self.fingerprint = alert_fingerprint(alert)
+        # Every idempotency key that resolved to this job
+        self.idempotency_keys: Set[str] = {idempotency_key} if idempotency_key else set()
+        self.submitted_at = time.monotonic()
+        # Jobs start as soon as they are submitted
+        self.status: Literal["running", "completed", "failed"] = "running"
+        self.created_at = datetime.utcnow()
+        self.started_at = self.created_at
+        self.finished_at: Optional[datetime] = None
+        self.time_to_last_call_seconds: Optional[float] = None
+        self.prompt_report: Optional[FAQPromptReport] = None
+        self.error: Optional[str] = None
+        self.outcomes: Dict[str, CallOutcome] = {
+            number: CallOutcome(phone_number=number) for number in phone_numbers
+        }
+        self.counts = {
+            "queued": len(self.outcomes),
+            "in_flight": 0,
+            "succeeded": 0,
+            "failed": 0,
+        }
+
+    @property
+    def phone_numbers(self) -> list[str]:
+        return list(self.outcomes)
+
+    def record(self, outcome: CallOutcome) -> None:
+        """Apply a call progress update, keeping the status counters in step"""
+        previous = self.outcomes.get(outcome.phone_number)
+        if previous is not None:
+            self.counts[previous.status] -= 1
+        self.counts[outcome.status] += 1
+        self.outcomes[outcome.phone_number] = outcome
+
+    def to_status(self, include_outcomes: bool = True) -> AlertJobStatus:
+        return AlertJobStatus(
+            job_id=self.id,
+            status=self.status,
+            event_name=self.alert.event_name,
+            urgency=self.alert.urgency,
+            total_recipients=len(self.outcomes),
+            queued=self.counts["queued"],
+            in_flight=self.counts["in_flight"],
+            succeeded=self.counts["succeeded"],
+            failed=self.counts["failed"],
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            time_to_last_call_seconds=self.time_to_last_call_seconds,
+            prompt_report=self.prompt_report,
+            error=self.error,
+            outcomes=list(self.outcomes.values()) if include_outcomes else [],
+        )
+
+
+class AlertJobRunner:
+    """
+    Tracks alert jobs and runs each one in the background as soon as it is submitted
+
+    Jobs are not queued behind each other: every job's calls go straight to
+    the voice service's shared call scheduler, which bounds calls in flight,
+    dials higher-urgency calls first and ages waiting calls so lower-urgency
+    alerts are never starved.
+
+    Only finished jobs are evicted, so `jobs` holds every running job plus up
+    to `retained_jobs` finished ones. Nothing caps how many jobs run at once;
+    under sustained load memory grows with the number of alerts still
+    dialling.
+    """
+
+    def __init__(
+        self,
+        voice_service: VoiceAlertService,
+        retained_jobs: int = DEFAULT_RETAINED_JOBS,
+        dedupe_window: float = DEFAULT_DEDUPE_WINDOW_SECONDS,
+        on_finished: Optional[Callable[[AlertJob], Awaitable[None]]] = None,
+    ):
+        self.voice_service = voice_service
+        self.on_finished = on_finished
+        self.retained_jobs = retained_jobs
+        self.dedupe_window = dedupe_window
+        self.jobs: "OrderedDict[str, AlertJob]" = OrderedDict()
+        # Idempotency key -> job id, for as long as the job is retained
+        self._keys: Dict[str, str] = {}
+        # Alert fingerprint -> most recent job id, oldest first, within the dedupe window
+        self._recent: "OrderedDict[str, str]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def stop(self) -> None:
+        """Cancel every running job"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def find_duplicate(
+        self, alert: AlertRequest, idempotency_key: Optional[str] = None
+    ) -> Optional[AlertJob]:
+        """
+        Find the job a new submission should attach to instead of dispatching again
+
+        Args:
+            alert: The alert being submitted
+            idempotency_key: Client-chosen key identifying this submission, if any
+
+        Returns:
+            The job with the same idempotency key or, failing that, an identical
+            alert submitted within the dedupe window that is still running;
+            None if there is neither
+
+        Raises:
+            IdempotencyConflict: The key belongs to a job for a different alert
+        """
+        fingerprint = alert_fingerprint(alert)
+        if idempotency_key is not None:
+            job = self.jobs.get(self._keys.get(idempotency_key, ""))
+            if job is not None:
+                if job.fingerprint != fingerprint:
+                    raise IdempotencyConflict("Idempotency key was already used for a different alert")
+                return job
+
+        self._expire_recent()
+        job = self.jobs.get(self._recent.get(fingerprint, ""))
+        # A finished job's recipient list is frozen: re-sending the alert must
+        # reach anyone who registered or entered the area since
+        if job is None or job.status != "running":
+            return None
+        return job
+
+    def submit(
+        self,
+        alert: AlertRequest,
+        phone_numbers: list[str],
+        idempotency_key: Optional[str] = None,
+        job_id: Optional[str] = None,
+    ) -> Tuple[AlertJob, bool]:
+        """
+        Start dispatching an alert, coalescing it with a duplicate already submitted
+
+        Args:
+            job_id: Id for the new job, e.g. one already claimed in shared state
+
+        Returns:
+            The job, and whether it was newly created
+        """
+        duplicate = self.find_duplicate(alert, idempotency_key)
+        if duplicate is not None:
+            if idempotency_key is not None and idempotency_key not in self._keys:
+                self._keys[idempotency_key] = duplicate.id
+                duplicate.idempotency_keys.add(idempotency_key)
+            return duplicate, False
+
+        job = AlertJob(alert, phone_numbers, idempotency_key, job_id)
+        self.jobs[job.id] = job
+        if idempotency_key is not None:
+            self._keys[idempotency_key] = job.id
+        self._recent.pop(job.fingerprint, None)
+        self._recent[job.fingerprint] = job.id
+        self._evict_finished()
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job, True
+
+    def _expire_recent(self) -> None:
+        cutoff = time.monotonic() - self.dedupe_window
+        while self._recent:
+            fingerprint, job_id = next(iter(self._recent.items()))
+            job = self.jobs.get(job_id)
+            if job is not None and job.submitted_at >= cutoff:
+                break
+            del self._recent[fingerprint]
+
+    def get(self, job_id: str) -> Optional[AlertJob]:
+        return self.jobs.get(job_id)
+
+    def _evict_finished(self) -> None:
+        """Drop the oldest finished jobs once more than `retained_jobs` are tracked"""
+        excess = len(self.jobs) - self.retained_jobs
+        if excess <= 0:
+            return
+        for job_id in [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.status in ("completed", "failed")
+        ][:excess]:
+            for key in self.jobs.pop(job_id).idempotency_keys:
+                self._keys.pop(key, None)
+
+    async def _run(self, job: AlertJob) -> None:
+        try:
+            result = await self.voice_service.send_call_alerts(
+                job.alert, job.phone_numbers, on_progress=job.record
+            )
+            job.time_to_last_call_seconds = result.time_to_last_call_seconds
+            job.prompt_report = result.prompt_report
+            job.status = "completed"
+        except Exception as e:
+            print(f"Alert job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.utcnow()
+            if self.on_finished is not None:
+                try:
+                    await self.on_finished(job)
+                except Exception as e:
+                    print(f"Alert job {job.id} finish hook failed: {e}")
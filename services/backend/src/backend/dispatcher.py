@@ -0,0 +1,324 @@
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Deque, Literal, NamedTuple, Optional, Tuple
+
+DEFAULT_MAX_ATTEMPTS = 4  # per call, for transient failures
+DEFAULT_RETRY_DEADLINE_SECONDS = 300.0  # give up retrying a throttled call after this long
+DEFAULT_BACKOFF_BASE_SECONDS = 0.5
+DEFAULT_BACKOFF_CAP_SECONDS = 30.0
+MAX_RETRY_AFTER_SECONDS = 120.0
+
+DEFAULT_CIRCUIT_FAILURE_THRESHOLD = 5
+DEFAULT_CIRCUIT_RESET_SECONDS = 10.0
+
+# Call scheduling priority by alert urgency; higher is dialled first
+URGENCY_PRIORITY = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+# A waiting call gains one priority level per this many seconds
+DEFAULT_AGING_SECONDS = 30.0
+
+
+class RateLimiter:
+    """Paces call placement so the provider sees at most `rate` requests per second"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every request for `seconds`, e.g. for a provider's Retry-After"""
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        """Wait until the next request slot is available"""
+        if self._interval == 0.0 and self._next_slot <= time.monotonic():
+            return
+
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = max(self._next_slot, slot + self._interval)
+
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on calls in flight, granted to waiters by priority
+
+    Each success grows the limit by about one per limit's worth of calls;
+    throttling halves it, at most once per `cooldown` so a burst of 429s from
+    one window of requests only counts once.
+
+    Free slots go to the highest-priority waiter, first come first served
+    within a priority. A waiter's priority rises by one level for every
+    `aging_seconds` it has waited, so low-priority calls are delayed by
+    urgent ones but never starved.
+    """
+
+    def __init__(
+        self,
+        maximum: int,
+        minimum: int = 1,
+        decrease_factor: float = 0.5,
+        cooldown: float = 1.0,
+        levels: int = len(URGENCY_PRIORITY),
+        aging_seconds: float = DEFAULT_AGING_SECONDS,
+    ):
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.aging_seconds = aging_seconds
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self._last_decrease = float("-inf")
+        # One FIFO of (enqueued at, future) per priority level
+        self._waiters: list[Deque[Tuple[float, asyncio.Future]]] = [deque() for _ in range(levels)]
+
+    def _has_slot(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def _next_waiters(self) -> Optional[Deque[Tuple[float, asyncio.Future]]]:
+        """The queue whose head has the highest aged priority"""
+        now = time.monotonic()
+        best = None
+        best_priority = float("-inf")
+        for level in range(len(self._waiters) - 1, -1, -1):
+            waiters = self._waiters[level]
+            while waiters and waiters[0][1].done():
+                waiters.popleft()
+            if not waiters:
+                continue
+            priority = level + (now - waiters[0][0]) / self.aging_seconds
+            if priority > best_priority:
+                best, best_priority = waiters, priority
+        return best
+
+    def _grant(self) -> None:
+        while self._has_slot():
+            waiters = self._next_waiters()
+            if waiters is None:
+                return
+            _, future = waiters.popleft()
+            self.in_flight += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: int = 0) -> None:
+        if self._has_slot() and self._next_waiters() is None:
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append((time.monotonic(), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Hand back a slot granted just before cancellation
+            if future.done() and not future.cancelled():
+                self.in_flight -= 1
+                self._grant()
+            else:
+                future.cancel()
+            raise
+
+    def release(self, succeeded: bool = False, throttled: bool = False) -> None:
+        self.in_flight -= 1
+        if throttled:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                self._last_decrease = now
+        elif succeeded:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._grant()
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a provider that keeps failing
+
+    After `failure_threshold` consecutive failures the circuit opens for
+    `reset_timeout` seconds. Then one probe call is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_CIRCUIT_RESET_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> Literal["closed", "open", "half_open"]:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def delay(self) -> float:
+        """Seconds to wait before attempting a call; 0 lets this caller through now"""
+        if self._opened_at is None:
+            return 0.0
+        now = time.monotonic()
+        remaining = self._opened_at + self.reset_timeout - now
+        if remaining > 0:
+            return remaining
+        # Half open: one probe at a time, replaced if it never reports back
+        if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+            return min(1.0, self.reset_timeout)
+        self._probe_started = now
+        return 0.0
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            print("VAPI circuit closed")
+        self.failures = 0
+        self._opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probe_started is not None or (
+            self._opened_at is None and self.failures >= self.failure_threshold
+        ):
+            print(f"VAPI circuit open for {self.reset_timeout}s after {self.failures} consecutive failures")
+            self._opened_at = time.monotonic()
+            self._probe_started = None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+def backoff_delay(
+    attempt: int,
+    base: float = DEFAULT_BACKOFF_BASE_SECONDS,
+    cap: float = DEFAULT_BACKOFF_CAP_SECONDS,
+) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (from 0)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class AttemptResult(NamedTuple):
+    # throttled: rate limited (429); transient: the provider did not take the
+    # request (503, connection failure); unknown: it may have (other 5xx, read
+    # timeout), so retrying could place the call twice
+    outcome: Literal["succeeded", "throttled", "transient", "unknown", "failed"]
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
+
+
+class CallDispatcher:
+    """
+    Places provider calls under adaptive concurrency, pacing, retries and a
+    circuit breaker
+
+    Throttled attempts shrink the concurrency limit, pause all dispatch for
+    the provider's Retry-After and are retried until `retry_deadline`.
+    Transient failures are retried with jittered backoff up to
+    `max_attempts`. Unknown failures are final but, like transient ones,
+    count towards opening the circuit. Other failures are final.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_calls: int,
+        calls_per_second: float,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_deadline: float = DEFAULT_RETRY_DEADLINE_SECONDS,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.concurrency = AdaptiveConcurrency(max_concurrent_calls)
+        self.rate_limiter = RateLimiter(calls_per_second)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.retry_deadline = retry_deadline
+
+    async def place(
+        self, attempt: Callable[[], Awaitable[AttemptResult]], priority: int = 0
+    ) -> Tuple[AttemptResult, int]:
+        """
+        Run `attempt` until it succeeds or retries are exhausted
+
+        Calls share one scheduler, so a call with a higher `priority` (see
+        URGENCY_PRIORITY) is placed ahead of every lower-priority call still
+        waiting, whichever alert they belong to.
+
+        Returns:
+            The last attempt's result and the number of attempts made
+        """
+        deadline = time.monotonic() + self.retry_deadline
+        attempts = 0
+        transient_failures = 0
+        while True:
+            while (wait := self.breaker.delay()) > 0:
+                if time.monotonic() + wait > deadline:
+                    return AttemptResult("failed", "Circuit open: VAPI unavailable"), attempts
+                await asyncio.sleep(wait)
+
+            await self.concurrency.acquire(priority)
+            try:
+                await self.rate_limiter.acquire()
+                attempts += 1
+                result = await attempt()
+            except BaseException:
+                self.concurrency.release()
+                raise
+            self.concurrency.release(
+                succeeded=result.outcome == "succeeded",
+                throttled=result.outcome == "throttled",
+            )
+
+            if result.outcome == "succeeded":
+                self.breaker.record_success()
+                return result, attempts
+            if result.outcome == "unknown":
+                self.breaker.record_failure()
+                return result, attempts
+            if result.outcome == "failed":
+                return result, attempts
+
+            if result.outcome == "throttled":
+                if result.retry_after is not None:
+                    self.rate_limiter.pause(result.retry_after)
+                    delay = result.retry_after + backoff_delay(0)
+                else:
+                    delay = backoff_delay(attempts - 1)
+            else:
+                self.breaker.record_failure()
+                transient_failures += 1
+                if transient_failures >= self.max_attempts:
+                    return result, attempts
+                delay = backoff_delay(transient_failures - 1)
+
+            if time.monotonic() + delay > deadline:
+                return result, attempts
+            await asyncio.sleep(delay)
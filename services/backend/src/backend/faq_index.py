@@ -0,0 +1,150 @@
+import math
+import re
+from collections import Counter
+from typing import NamedTuple, Optional
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*$")
+TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have how i if in is it me my "
+    "of on or our please the this to was we what when where which who will with "
+    "you your".split()
+)
+
+# Extra query terms so urgent alerts pull in safety sections
+URGENCY_QUERY_TERMS = {
+    "low": "",
+    "medium": "",
+    "high": "safety emergency exits staff",
+    "critical": "emergency evacuation exits safety medical first aid security contacts",
+}
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def alert_query(event_name: str, description: str, urgency: str) -> str:
+    """Build the section ranking query for an alert"""
+    return f"{event_name} {description} {URGENCY_QUERY_TERMS.get(urgency, '')}"
+
+
+class FAQSection(NamedTuple):
+    title: str  # heading path, e.g. "Emergency Information > Emergency Exits"
+    body: str
+
+    def render(self) -> str:
+        return f"### {self.title}\n{self.body}"
+
+
+def split_sections(markdown: str) -> list[FAQSection]:
+    """
+    Split FAQ markdown into one section per heading
+
+    Each section is titled with its full heading path so it still reads
+    correctly on its own; headings without body text only contribute to
+    their children's titles.
+    """
+    sections = []
+    path: list[tuple[int, str]] = []
+    body: list[str] = []
+
+    def flush():
+        text = "\n".join(body).strip()
+        if text:
+            title = " > ".join(name for _, name in path[1:] or path) or "Overview"
+            sections.append(FAQSection(title, text))
+        body.clear()
+
+    for line in markdown.splitlines():
+        match = HEADING.match(line)
+        if not match:
+            body.append(line)
+            continue
+        flush()
+        level = len(match.group(1))
+        while path and path[-1][0] >= level:
+            path.pop()
+        path.append((level, match.group(2).strip("\"' ")))
+    flush()
+    return sections
+
+
+class FAQIndex:
+    """BM25 index over the sections of one event FAQ"""
+
+    def __init__(self, markdown: str):
+        self.sections = split_sections(markdown)
+        self.section_tokens = [estimate_tokens(s.render()) for s in self.sections]
+        self._term_counts = [
+            Counter(tokenize(f"{s.title} {s.title} {s.body}")) for s in self.sections
+        ]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+        document_frequency: Counter = Counter()
+        for counts in self._term_counts:
+            document_frequency.update(counts.keys())
+        n = len(self.sections)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def score(self, query: str) -> list[float]:
+        """BM25 score of every section for a query"""
+        terms = set(tokenize(query))
+        scores = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            score = 0.0
+            norm = K1 * (1 - B + B * length / self._avg_length) if self._avg_length else K1
+            for term in terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (K1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def select(self, query: str, top_k: int, token_budget: int) -> list[FAQSection]:
+        """
+        Pick the event overview plus the highest-scoring sections for a query
+
+        Sections are added best-first while they fit within `token_budget`
+        and returned in document order so the prompt reads like the FAQ.
+        """
+        if not self.sections:
+            return []
+
+        # The first section is the event overview and is always included
+        chosen = {0}
+        used = self.section_tokens[0]
+        scores = self.score(query)
+        ranked = sorted(
+            (i for i in range(1, len(self.sections)) if scores[i] > 0),
+            key=lambda i: scores[i],
+            reverse=True,
+        )
+        for i in ranked:
+            if len(chosen) > top_k:
+                break
+            if used + self.section_tokens[i] <= token_budget:
+                chosen.add(i)
+                used += self.section_tokens[i]
+
+        return [self.sections[i] for i in sorted(chosen)]
+
+
+def render_sections(sections: list[FAQSection]) -> Optional[str]:
+    if not sections:
+        return None
+    return "\n\n".join(section.render() for section in sections)
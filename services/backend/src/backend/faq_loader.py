@@ -1,11 +1,125 @@
+import asyncio
 import os
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import NamedTuple, Optional, Tuple
+
+from .faq_index import FAQIndex, estimate_tokens, render_sections
+from .models import FAQPromptReport
+
+DEFAULT_MAX_CACHED_EVENTS = 64
+DEFAULT_REFRESH_INTERVAL_SECONDS = 10.0
+
+# Relevance-ranked FAQ sections per alert; FAQ_TOP_K=0 sends the whole FAQ
+DEFAULT_FAQ_TOP_K = 4
+DEFAULT_FAQ_TOKEN_BUDGET = 600
+
+ASSISTANT_INSTRUCTIONS = """
+You are an AI assistant helping attendees during an emergency or important event alert.
+
+INSTRUCTIONS:
+1. First, clearly communicate the urgent alert message above
+2. Then offer to answer any questions about the event or emergency procedures
+3. Use the FAQ information below to provide accurate, helpful responses
+4. If someone asks a question not covered in the FAQ, acknowledge you don't have that specific information and suggest they contact event staff
+5. Keep responses concise but helpful
+6. Prioritize safety information in emergencies
+
+"""
+
+
+class CachedFAQ(NamedTuple):
+    mtime_ns: Optional[int]  # None when the event has no FAQ file
+    content: Optional[str]
+    context_suffix: str  # rendered assistant context following the alert line
+    section_index: Optional[FAQIndex]  # section index for relevance ranking
 
 
 class FAQLoader:
-    def __init__(self):
+    def __init__(
+        self,
+        max_cached_events: int = DEFAULT_MAX_CACHED_EVENTS,
+        top_k: Optional[int] = None,
+        token_budget: Optional[int] = None,
+    ):
         self.events_dir = Path(__file__).parent / "events"
+        self.max_cached_events = max_cached_events
+        self.top_k = top_k if top_k is not None else int(os.getenv("FAQ_TOP_K", DEFAULT_FAQ_TOP_K))
+        self.token_budget = token_budget or int(os.getenv("FAQ_TOKEN_BUDGET", DEFAULT_FAQ_TOKEN_BUDGET))
+        self._cache: "OrderedDict[str, CachedFAQ]" = OrderedDict()
+        self._available_events: Optional[list[str]] = None
+
+    def _read_faq(self, event_slug: str) -> CachedFAQ:
+        """Read an event FAQ from disk and render its context suffix"""
+        faq_file = self.events_dir / f"{event_slug}.md"
+
+        try:
+            mtime_ns = faq_file.stat().st_mtime_ns
+            with open(faq_file, "r", encoding="utf-8") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return CachedFAQ(None, None, self._render_context_suffix(None), None)
+        except Exception as e:
+            print(f"Error loading FAQ for {event_slug}: {e}")
+            return CachedFAQ(None, None, self._render_context_suffix(None), None)
+
+        return CachedFAQ(
+            mtime_ns, content, self._render_context_suffix(content), FAQIndex(content)
+        )
+
+    def _cached(self, event_slug: str) -> CachedFAQ:
+        """Get an event's FAQ from the LRU cache, reading it on a miss"""
+        entry = self._cache.get(event_slug)
+        if entry is not None:
+            self._cache.move_to_end(event_slug)
+            return entry
+
+        entry = self._read_faq(event_slug)
+        self._cache[event_slug] = entry
+        while len(self._cache) > self.max_cached_events:
+            self._cache.popitem(last=False)
+        return entry
+
+    def preload(self) -> int:
+        """Cache every event in the events directory, returning how many were loaded"""
+        self._available_events = self._scan_events()
+        for event_slug in self._available_events[: self.max_cached_events]:
+            self._cached(event_slug)
+        return len(self._available_events)
+
+    def refresh(self) -> list[str]:
+        """
+        Reload cached FAQs whose file mtime changed (or that appeared or
+        disappeared) and rescan the events directory
+
+        Returns:
+            Slugs that were reloaded
+        """
+        self._available_events = self._scan_events()
+        reloaded = []
+        for event_slug, entry in list(self._cache.items()):
+            faq_file = self.events_dir / f"{event_slug}.md"
+            try:
+                mtime_ns: Optional[int] = faq_file.stat().st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if mtime_ns != entry.mtime_ns:
+                self._cache[event_slug] = self._read_faq(event_slug)
+                reloaded.append(event_slug)
+        return reloaded
+
+    async def run_refresher(
+        self, interval: float = DEFAULT_REFRESH_INTERVAL_SECONDS
+    ) -> None:
+        """Revalidate the cache in the background so lookups stay in memory"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                reloaded = await asyncio.to_thread(self.refresh)
+                if reloaded:
+                    print(f"Reloaded FAQs: {', '.join(reloaded)}")
+            except Exception as e:
+                print(f"Error refreshing FAQs: {e}")
 
     def load_event_faq(self, event_slug: str) -> Optional[str]:
         """
@@ -17,24 +131,33 @@ class FAQLoader:
         Returns:
             FAQ content as string, or None if not found
         """
-        faq_file = self.events_dir / f"{event_slug}.md"
+        return self._cached(event_slug).content
 
-        if not faq_file.exists():
-            return None
+    def _scan_events(self) -> list[str]:
+        if not self.events_dir.exists():
+            return []
 
-        try:
-            with open(faq_file, "r", encoding="utf-8") as f:
-                return f.read()
-        except Exception as e:
-            print(f"Error loading FAQ for {event_slug}: {e}")
-            return None
+        return [f.stem for f in self.events_dir.glob("*.md") if f.is_file()]
 
     def get_available_events(self) -> list[str]:
         """Get list of available event slugs"""
-        if not self.events_dir.exists():
-            return []
+        if self._available_events is None:
+            self._available_events = self._scan_events()
+        return list(self._available_events)
 
-        return [f.stem for f in self.events_dir.glob("*.md") if f.is_file()]
+    @staticmethod
+    def _render_context_suffix(faq_content: Optional[str]) -> str:
+        """Render the part of the assistant context that does not depend on the alert"""
+        if faq_content:
+            return ASSISTANT_INSTRUCTIONS + f"""
+EVENT FAQ INFORMATION:
+{faq_content}
+
+Remember: Use this information to answer attendee questions, but always prioritize the urgent alert message first.
+"""
+        return ASSISTANT_INSTRUCTIONS + """
+Note: No specific FAQ information is available for this event. Direct attendees to contact event staff for detailed questions.
+"""
 
     def create_assistant_context(self, event_slug: str, alert_message: str) -> str:
         """
@@ -47,33 +170,44 @@ class FAQLoader:
         Returns:
             Full context string for the assistant
         """
-        faq_content = self.load_event_faq(event_slug)
-
-        base_context = f"""
-URGENT ALERT: {alert_message}
-
-You are an AI assistant helping attendees during an emergency or important event alert. 
+        return f"\nURGENT ALERT: {alert_message}\n" + self._cached(event_slug).context_suffix
 
-INSTRUCTIONS:
-1. First, clearly communicate the urgent alert message above
-2. Then offer to answer any questions about the event or emergency procedures
-3. Use the FAQ information below to provide accurate, helpful responses
-4. If someone asks a question not covered in the FAQ, acknowledge you don't have that specific information and suggest they contact event staff
-5. Keep responses concise but helpful
-6. Prioritize safety information in emergencies
-
-"""
+    def create_relevant_assistant_context(
+        self, event_slug: str, alert_message: str, query: str
+    ) -> Tuple[str, Optional[FAQPromptReport]]:
+        """
+        Create the assistant context with only the FAQ sections relevant to an alert
 
-        if faq_content:
-            base_context += f"""
-EVENT FAQ INFORMATION:
-{faq_content}
+        Args:
+            event_slug: The event identifier
+            alert_message: The original alert message
+            query: Text to rank FAQ sections against (see faq_index.alert_query)
 
-Remember: Use this information to answer attendee questions, but always prioritize the urgent alert message first.
-"""
+        Returns:
+            Context string for the assistant, and a report of how much smaller
+            it is than the full-FAQ context (None when the event has no FAQ)
+        """
+        header = f"\nURGENT ALERT: {alert_message}\n"
+        entry = self._cached(event_slug)
+        full_context = header + entry.context_suffix
+        if entry.section_index is None:
+            return full_context, None
+
+        if self.top_k > 0:
+            sections = entry.section_index.select(query, self.top_k, self.token_budget)
+            context = header + self._render_context_suffix(render_sections(sections))
         else:
-            base_context += """
-Note: No specific FAQ information is available for this event. Direct attendees to contact event staff for detailed questions.
-"""
-
-        return base_context
+            sections = entry.section_index.sections
+            context = full_context
+
+        full_tokens = estimate_tokens(full_context)
+        prompt_tokens = estimate_tokens(context)
+        report = FAQPromptReport(
+            event_slug=event_slug,
+            sections_total=len(entry.section_index.sections),
+            sections_included=len(sections),
+            full_prompt_tokens=full_tokens,
+            prompt_tokens=prompt_tokens,
+            reduction_percent=round(100 * (1 - prompt_tokens / full_tokens), 1),
+        )
+        return context, report
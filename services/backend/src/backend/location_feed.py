@@ -0,0 +1,121 @@
+import asyncio
+import heapq
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from .models import UserLocation
+
+OFFLINE_AFTER_SECONDS = 300
+EXPIRY_INTERVAL_SECONDS = 5.0
+
+
+class LocationFeed:
+    """
+    Change sequence and offline expiry for the user location map
+
+    Every change (update, offline transition, removal) takes the next sequence
+    number, and `changes_since` walks back from the newest change until it
+    reaches the client's cursor, so a delta costs O(changes) rather than
+    O(users). Offline transitions are driven by an expiry heap holding at most
+    one deadline per user; a deadline that has been pushed back by newer fixes
+    is rescheduled when it surfaces instead of being re-pushed on every update.
+
+    Sequence numbers restart with the process, so cursors handed to clients
+    carry a per-process epoch ("<epoch>:<seq>"); a cursor from another
+    process is never mistaken for a position in this one.
+    """
+
+    def __init__(
+        self,
+        locations: Dict[str, UserLocation],
+        offline_after_seconds: float = OFFLINE_AFTER_SECONDS,
+    ):
+        self.locations = locations
+        self.offline_after = timedelta(seconds=offline_after_seconds)
+        self.seq = 0
+        self.epoch = uuid.uuid4().hex[:12]
+        self._changes: "OrderedDict[str, int]" = OrderedDict()
+        self._expiry: list[Tuple[datetime, str]] = []
+        self._scheduled: Set[str] = set()
+        self._listeners: list[Callable[[str, int], None]] = []
+
+    def cursor(self, seq: Optional[int] = None) -> str:
+        """Client cursor for `seq`, by default the latest change"""
+        return f"{self.epoch}:{self.seq if seq is None else seq}"
+
+    def parse_cursor(self, cursor: str) -> Optional[int]:
+        """Sequence number of a client cursor, or None if it is not from this process"""
+        epoch, _, seq = cursor.partition(":")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        return int(seq)
+
+    def add_listener(self, listener: Callable[[str, int], None]) -> None:
+        """Call `listener(user_id, seq)` after every change"""
+        self._listeners.append(listener)
+
+    def _bump(self, user_id: str) -> int:
+        self.seq += 1
+        self._changes[user_id] = self.seq
+        self._changes.move_to_end(user_id)
+        for listener in self._listeners:
+            listener(user_id, self.seq)
+        return self.seq
+
+    def touch(self, user_id: str) -> int:
+        """Record that a user's location was updated and schedule their offline deadline"""
+        if user_id not in self._scheduled:
+            deadline = self.locations[user_id].last_updated + self.offline_after
+            heapq.heappush(self._expiry, (deadline, user_id))
+            self._scheduled.add(user_id)
+        return self._bump(user_id)
+
+    def remove(self, user_id: str) -> int:
+        """Record that a user's location was removed"""
+        self._scheduled.discard(user_id)
+        return self._bump(user_id)
+
+    def expire(self, now: Optional[datetime] = None) -> list[str]:
+        """Mark users offline whose deadline has passed, returning their ids"""
+        now = now or datetime.utcnow()
+        expired = []
+        while self._expiry and self._expiry[0][0] <= now:
+            _, user_id = heapq.heappop(self._expiry)
+            location = self.locations.get(user_id)
+            if location is None or user_id not in self._scheduled:
+                continue
+
+            deadline = location.last_updated + self.offline_after
+            if deadline > now:
+                heapq.heappush(self._expiry, (deadline, user_id))
+                continue
+
+            self._scheduled.discard(user_id)
+            location.status = "offline"
+            self._bump(user_id)
+            expired.append(user_id)
+        return expired
+
+    def changes_since(self, cursor: int) -> Tuple[list[UserLocation], list[str]]:
+        """Locations changed after `cursor`, and ids of locations removed after it"""
+        changed = []
+        removed = []
+        for user_id in reversed(self._changes):
+            if self._changes[user_id] <= cursor:
+                break
+            location = self.locations.get(user_id)
+            if location is None:
+                removed.append(user_id)
+            else:
+                changed.append(location)
+        changed.reverse()
+        removed.reverse()
+        return changed, removed
+
+    async def run_expiry(self, interval: float = EXPIRY_INTERVAL_SECONDS) -> None:
+        """Periodically expire stale locations so offline transitions happen without reads"""
+        while True:
+            await asyncio.sleep(interval)
+            self.expire()
@@ -0,0 +1,135 @@
+import asyncio
+import json
+from typing import AsyncIterator, Callable, Dict, Optional, Set, Tuple
+
+from .models import UserLocation
+
+BATCH_INTERVAL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 15.0
+
+BoundingBox = Tuple[float, float, float, float]
+
+
+def _in_bbox(bbox: BoundingBox, lat: float, lon: float) -> bool:
+    min_lat, min_lon, max_lat, max_lon = bbox
+    if not min_lat <= lat <= max_lat:
+        return False
+    if min_lon > max_lon:
+        return lon >= min_lon or lon <= max_lon
+    return min_lon <= lon <= max_lon
+
+
+class LocationSubscriber:
+    """
+    A dashboard's view of location changes
+
+    Pending changes are coalesced per user (only the newest state is kept), so
+    a slow subscriber holds at most one entry per user and never pushes back
+    on the ingest path.
+    """
+
+    def __init__(self, bbox: Optional[BoundingBox] = None):
+        self.bbox = bbox
+        self.cursor = 0
+        self.visible: Set[str] = set()
+        self.pending: Dict[str, Optional[dict]] = {}
+        self.ready = asyncio.Event()
+
+    def offer(
+        self, user_id: str, location: Optional[UserLocation], payload: Optional[dict], seq: int
+    ) -> None:
+        """Queue a change if it is relevant to this subscriber's view"""
+        self.cursor = seq
+        in_view = location is not None and (
+            self.bbox is None or _in_bbox(self.bbox, location.latitude, location.longitude)
+        )
+
+        if in_view:
+            self.visible.add(user_id)
+            self.pending[user_id] = payload
+        elif user_id in self.visible:
+            # Removed, or moved out of the viewport
+            self.visible.discard(user_id)
+            self.pending[user_id] = None
+        else:
+            return
+
+        self.ready.set()
+
+    def drain(self, format_cursor: Callable[[int], object] = int) -> dict:
+        """Take the coalesced batch of pending changes"""
+        pending, self.pending = self.pending, {}
+        self.ready.clear()
+        return {
+            "cursor": format_cursor(self.cursor),
+            "locations": [payload for payload in pending.values() if payload is not None],
+            "removed": [user_id for user_id, payload in pending.items() if payload is None],
+        }
+
+
+class LocationBroadcaster:
+    """Fans location changes out to streaming dashboard subscribers"""
+
+    def __init__(
+        self,
+        locations: Dict[str, UserLocation],
+        serialize: Callable[[UserLocation], dict],
+        batch_interval: float = BATCH_INTERVAL_SECONDS,
+        heartbeat: float = HEARTBEAT_SECONDS,
+        format_cursor: Callable[[int], object] = int,
+    ):
+        self.locations = locations
+        self.serialize = serialize
+        # Turns a change sequence number into the cursor clients see
+        self.format_cursor = format_cursor
+        self.batch_interval = batch_interval
+        self.heartbeat = heartbeat
+        self._subscribers: Set[LocationSubscriber] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, user_id: str, seq: int) -> None:
+        """Offer a location change to every subscriber without blocking"""
+        if not self._subscribers:
+            return
+
+        location = self.locations.get(user_id)
+        payload = self.serialize(location) if location is not None else None
+        for subscriber in self._subscribers:
+            subscriber.offer(user_id, location, payload, seq)
+
+    def subscribe(self, bbox: Optional[BoundingBox] = None) -> LocationSubscriber:
+        subscriber = LocationSubscriber(bbox)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: LocationSubscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    async def stream(
+        self, subscriber: LocationSubscriber, snapshot: dict
+    ) -> AsyncIterator[str]:
+        """
+        Yield Server-Sent Events for a subscriber
+
+        The first event is `snapshot`; later `locations` events carry the
+        changes batched over each `batch_interval`. Comment lines are sent as
+        heartbeats so proxies keep the connection open.
+        """
+        try:
+            subscriber.visible.update(loc["user_id"] for loc in snapshot["locations"])
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+
+            while True:
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+
+                # Let further changes accumulate so they go out as one batch
+                await asyncio.sleep(self.batch_interval)
+                yield f"event: locations\ndata: {json.dumps(subscriber.drain(self.format_cursor))}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
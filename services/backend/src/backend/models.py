@@ -1,7 +1,7 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import Literal, Optional
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
 class UserRegistration(BaseModel):
     full_name: str = Field(..., min_length=1, max_length=100)
@@ -28,22 +28,92 @@ class RegistrationResponse(BaseModel):
     message: str
     user_id: str
 
+class GeoPoint(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+class CircleTarget(GeoPoint):
+    radius_m: float = Field(..., gt=0, le=100_000, description="Radius of the target area in meters")
+
+class PolygonTarget(BaseModel):
+    points: list[GeoPoint] = Field(..., min_length=3, max_length=500, description="Polygon vertices in order")
+
 class AlertRequest(BaseModel):
     event_name: str = Field(..., min_length=1, max_length=100)
     description: str = Field(..., min_length=1, max_length=500)
     urgency: Literal["low", "medium", "high", "critical"]
     event_slug: Optional[str] = Field(None, description="Event identifier for FAQ lookup (e.g., 'xai-vercel-hackathon')")
+    target_circle: Optional[CircleTarget] = Field(None, description="Only call users inside this circle")
+    target_polygon: Optional[PolygonTarget] = Field(None, description="Only call users inside this polygon")
+    stale_allowance_m: float = Field(250, ge=0, le=5000, description="Maximum distance outside the target area to still call users whose location is stale or imprecise")
+
+    @property
+    def is_geofenced(self) -> bool:
+        return self.target_circle is not None or self.target_polygon is not None
+
+class FAQPromptReport(BaseModel):
+    event_slug: str
+    sections_total: int
+    sections_included: int
+    full_prompt_tokens: int
+    prompt_tokens: int
+    reduction_percent: float
 
 class AlertResponse(BaseModel):
     success: bool
     message: str
     recipients_contacted: int
+    time_to_last_call_seconds: Optional[float] = Field(None, description="Seconds from dispatch start until the last call attempt completed")
+    prompt_report: Optional[FAQPromptReport] = None
+
+class CallOutcome(BaseModel):
+    phone_number: str
+    status: Literal["queued", "in_flight", "succeeded", "failed"] = "queued"
+    error: Optional[str] = None
+    attempts: int = 0
+
+class AlertJobResponse(BaseModel):
+    success: bool
+    message: str
+    job_id: str
+    recipients_queued: int
+    duplicate: bool = Field(False, description="True when this request was coalesced into an earlier identical alert")
+
+class AlertJobStatus(BaseModel):
+    job_id: str
+    status: Literal["running", "completed", "failed"]
+    event_name: str
+    urgency: str
+    total_recipients: int
+    queued: int
+    in_flight: int
+    succeeded: int
+    failed: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    time_to_last_call_seconds: Optional[float] = None
+    prompt_report: Optional[FAQPromptReport] = None
+    error: Optional[str] = None
+    outcomes: list[CallOutcome] = []
 
 class LocationUpdate(BaseModel):
     user_id: str = Field(..., description="ID of the registered user")
     latitude: float = Field(..., ge=-90, le=90, description="Latitude coordinate")
     longitude: float = Field(..., ge=-180, le=180, description="Longitude coordinate")
     accuracy: Optional[float] = Field(None, ge=0, description="GPS accuracy in meters")
+    recorded_at: Optional[datetime] = Field(None, description="When the fix was taken, for buffered updates; defaults to receipt time")
+
+    @field_validator("recorded_at")
+    @classmethod
+    def normalize_recorded_at(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored timestamps are naive UTC
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        # Track history stores unsigned epoch seconds
+        if value is not None and value < datetime(1970, 1, 1):
+            raise ValueError("recorded_at must not be before 1970-01-01T00:00:00Z")
+        return value
 
 class UserLocation(BaseModel):
     user_id: str
@@ -57,4 +127,17 @@ class UserLocation(BaseModel):
 
 class LocationResponse(BaseModel):
     success: bool
-    message: str
\ No newline at end of file
+    message: str
+
+class LocationBatchItemResult(BaseModel):
+    index: int
+    user_id: Optional[str] = None
+    status: Literal["applied", "superseded", "rejected"]
+    error: Optional[str] = None
+
+class LocationBatchResponse(BaseModel):
+    success: bool
+    applied: int
+    superseded: int
+    rejected: int
+    results: list[LocationBatchItemResult]
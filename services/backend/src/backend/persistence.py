@@ -0,0 +1,448 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+from .models import AlertJobStatus, RegisteredUser, UserLocation
+
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1.0
+DEFAULT_SYNC_INTERVAL_SECONDS = 0.5
+
+# Change log rows kept for workers catching up; a worker further behind reloads everything
+CHANGE_LOG_RETENTION = 200_000
+
+# How long a writer waits for another process's write lock
+BUSY_TIMEOUT_MS = 5000
+
+# How long an Idempotency-Key keeps resolving to its alert across workers
+IDEMPOTENCY_KEY_RETENTION_SECONDS = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    phone_number TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS locations (
+    user_id TEXT PRIMARY KEY,
+    user_name TEXT NOT NULL,
+    phone_number TEXT NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    accuracy REAL,
+    last_updated TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    origin TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alert_claims (
+    claim TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    recipients INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alert_claims_job_id ON alert_claims (job_id);
+CREATE TABLE IF NOT EXISTS alert_jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Only store a location if its user exists and it is not older than the stored one
+UPSERT_LOCATION = """
+INSERT INTO locations (user_id, user_name, phone_number, latitude, longitude, accuracy, last_updated)
+SELECT ?, ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM users WHERE id = ?)
+ON CONFLICT (user_id) DO UPDATE SET
+    user_name = excluded.user_name,
+    phone_number = excluded.phone_number,
+    latitude = excluded.latitude,
+    longitude = excluded.longitude,
+    accuracy = excluded.accuracy,
+    last_updated = excluded.last_updated
+WHERE excluded.last_updated >= locations.last_updated
+"""
+
+LOCATION_COLUMNS = "user_id, user_name, phone_number, latitude, longitude, accuracy, last_updated"
+
+
+class DuplicatePhoneNumber(ValueError):
+    """Another user, possibly registered through another worker, has this phone number"""
+
+
+class StateChanges(NamedTuple):
+    """Changes other workers made since a cursor"""
+
+    cursor: int
+    full: bool  # the cursor fell out of the change log; users is the complete set
+    users: list[RegisteredUser]
+    removed_user_ids: list[str]
+    locations: list[UserLocation]
+
+
+class AlertClaim(NamedTuple):
+    """An alert dispatch some worker has started"""
+
+    job_id: str
+    fingerprint: str  # fingerprint_digest() of the alert
+    recipients: int
+    kind: str  # "key" if matched by idempotency key, "fingerprint" if by identical content
+
+
+def fingerprint_digest(fingerprint: str) -> str:
+    """Fixed-size form of an alert fingerprint for storage and comparison"""
+    return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+
+def _location_from_row(row) -> UserLocation:
+    user_id, user_name, phone_number, latitude, longitude, accuracy, last_updated = row
+    return UserLocation(
+        user_id=user_id,
+        user_name=user_name,
+        phone_number=phone_number,
+        latitude=latitude,
+        longitude=longitude,
+        accuracy=accuracy,
+        last_updated=datetime.fromisoformat(last_updated),
+    )
+
+
+class StateBackend(ABC):
+    """
+    Durable, shared home of registered users and their latest locations
+
+    Each worker serves requests from its in-memory maps and writes through to
+    the backend. A backend shared between processes reports other workers'
+    writes through changes_since() so every worker's maps converge.
+    """
+
+    flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS
+
+    @abstractmethod
+    def cursor(self) -> int:
+        """Position in the change log, to read before loading state"""
+
+    @abstractmethod
+    def load_users(self) -> list[RegisteredUser]: ...
+
+    @abstractmethod
+    def load_locations(self) -> list[UserLocation]: ...
+
+    @abstractmethod
+    def save_user(self, user: RegisteredUser) -> None:
+        """
+        Store a new or updated user
+
+        Raises:
+            DuplicatePhoneNumber: Another user already has the phone number
+        """
+
+    @abstractmethod
+    def delete_user(self, user_id: str) -> None: ...
+
+    @abstractmethod
+    def queue_location(self, location: UserLocation) -> None:
+        """Stage a location for the next flush"""
+
+    @abstractmethod
+    async def flush(self) -> int:
+        """Write staged locations, returning how many were written"""
+
+    @abstractmethod
+    def changes_since(self, cursor: int) -> StateChanges: ...
+
+    @abstractmethod
+    def claim_alert(
+        self,
+        job_id: str,
+        fingerprint: str,
+        recipients: int,
+        idempotency_key: Optional[str],
+        dedupe_window: float,
+    ) -> Optional[AlertClaim]:
+        """
+        Record that job_id is dispatching an alert, unless a worker already is
+
+        Returns:
+            The earlier dispatch with the same idempotency key or, failing
+            that, an identical alert still in flight; None if job_id now owns
+            the alert
+        """
+
+    @abstractmethod
+    def release_alert(self, job_id: str) -> None:
+        """Mark a dispatch finished so an identical alert is sent again"""
+
+    @abstractmethod
+    def save_alert_statuses(self, statuses: list[AlertJobStatus]) -> None:
+        """Publish progress of alert jobs this worker is running"""
+
+    @abstractmethod
+    def load_alert_status(self, job_id: str) -> Optional[AlertJobStatus]:
+        """Latest published progress of an alert job, whichever worker runs it"""
+
+    @abstractmethod
+    def close(self) -> None: ...
+
+    async def run_flusher(self) -> None:
+        """Flush staged locations every flush_interval seconds"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Failed to persist locations: {e}")
+
+
+class SQLiteStateStore(StateBackend):
+    """
+    SQLite persistence for registered users and their latest locations
+
+    The database runs in WAL mode with synchronous=NORMAL, so commits append
+    to the log without an fsync each. Registrations are written through
+    immediately. Location updates are coalesced per user and group-committed
+    every `flush_interval` seconds in one transaction, off the event loop, so
+    1 Hz ingest never waits on the disk.
+
+    Any number of worker processes can share one database file. Writers take
+    turns through SQLite's locking (waiting up to BUSY_TIMEOUT_MS), a
+    location only replaces a newer one never, and every write is recorded in
+    a change log tagged with the writing process so the others can follow it.
+    """
+
+    def __init__(self, path: str, flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+        self._conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._pending_locations: Dict[str, UserLocation] = {}
+        self._flushes = 0
+
+    def cursor(self) -> int:
+        with self._lock:
+            (seq,) = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()
+        return seq
+
+    def load_users(self) -> list[RegisteredUser]:
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM users").fetchall()
+        return [RegisteredUser.model_validate_json(data) for (data,) in rows]
+
+    def load_locations(self) -> list[UserLocation]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {LOCATION_COLUMNS} FROM locations").fetchall()
+        return [_location_from_row(row) for row in rows]
+
+    def _log(self, kind: str, user_ids: list[str]) -> None:
+        self._conn.executemany(
+            "INSERT INTO changes (kind, user_id, origin) VALUES (?, ?, ?)",
+            [(kind, user_id, self.origin) for user_id in user_ids],
+        )
+
+    def save_user(self, user: RegisteredUser) -> None:
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO users (id, phone_number, data) VALUES (?, ?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET phone_number = excluded.phone_number, data = excluded.data",
+                    (user.id, user.phone_number, user.model_dump_json()),
+                )
+                self._log("user", [user.id])
+        except sqlite3.IntegrityError as e:
+            raise DuplicatePhoneNumber(user.phone_number) from e
+
+    def delete_user(self, user_id: str) -> None:
+        self._pending_locations.pop(user_id, None)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            self._conn.execute("DELETE FROM locations WHERE user_id = ?", (user_id,))
+            self._log("user_deleted", [user_id])
+
+    def queue_location(self, location: UserLocation) -> None:
+        """Stage a location for the next group commit, replacing any staged one for the user"""
+        self._pending_locations[location.user_id] = location
+
+    def _write_locations(self, locations: list[UserLocation]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                UPSERT_LOCATION,
+                [
+                    (
+                        loc.user_id,
+                        loc.user_name,
+                        loc.phone_number,
+                        loc.latitude,
+                        loc.longitude,
+                        loc.accuracy,
+                        # Fixed width so stored timestamps compare correctly as text
+                        loc.last_updated.isoformat(timespec="microseconds"),
+                        loc.user_id,
+                    )
+                    for loc in locations
+                ],
+            )
+            self._log("location", [loc.user_id for loc in locations])
+
+            self._flushes += 1
+            if self._flushes % 100 == 0:
+                self._conn.execute(
+                    "DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?",
+                    (CHANGE_LOG_RETENTION,),
+                )
+
+    async def flush(self) -> int:
+        """Commit staged locations in one transaction, returning how many were written"""
+        if not self._pending_locations:
+            return 0
+        pending, self._pending_locations = self._pending_locations, {}
+        try:
+            await asyncio.to_thread(self._write_locations, list(pending.values()))
+        except Exception:
+            # Re-stage for the next commit unless a newer fix has replaced it
+            for user_id, location in pending.items():
+                self._pending_locations.setdefault(user_id, location)
+            raise
+        return len(pending)
+
+    def changes_since(self, cursor: int) -> StateChanges:
+        """
+        Users and locations other processes changed after `cursor`
+
+        Reads one consistent snapshot. When the change log no longer reaches
+        back to `cursor`, returns every user and location with full=True.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                latest, oldest = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0), COALESCE(MIN(seq), 0) FROM changes"
+                ).fetchone()
+                if latest <= cursor:
+                    return StateChanges(cursor, False, [], [], [])
+
+                if cursor < oldest - 1:
+                    users = self._conn.execute("SELECT data FROM users").fetchall()
+                    locations = self._conn.execute(f"SELECT {LOCATION_COLUMNS} FROM locations").fetchall()
+                    removed = []
+                    full = True
+                else:
+                    window = "SELECT user_id FROM changes WHERE seq > ? AND seq <= ? AND origin != ? AND kind = ?"
+                    users = self._conn.execute(
+                        f"SELECT data FROM users WHERE id IN ({window})",
+                        (cursor, latest, self.origin, "user"),
+                    ).fetchall()
+                    removed = self._conn.execute(
+                        f"SELECT DISTINCT user_id FROM ({window}) WHERE user_id NOT IN (SELECT id FROM users)",
+                        (cursor, latest, self.origin, "user_deleted"),
+                    ).fetchall()
+                    locations = self._conn.execute(
+                        f"SELECT {LOCATION_COLUMNS} FROM locations WHERE user_id IN ({window})",
+                        (cursor, latest, self.origin, "location"),
+                    ).fetchall()
+                    full = False
+            finally:
+                self._conn.execute("COMMIT")
+
+        return StateChanges(
+            cursor=latest,
+            full=full,
+            users=[RegisteredUser.model_validate_json(data) for (data,) in users],
+            removed_user_ids=[user_id for (user_id,) in removed],
+            locations=[_location_from_row(row) for row in locations],
+        )
+
+    def claim_alert(
+        self,
+        job_id: str,
+        fingerprint: str,
+        recipients: int,
+        idempotency_key: Optional[str],
+        dedupe_window: float,
+    ) -> Optional[AlertClaim]:
+        digest = fingerprint_digest(fingerprint)
+        now = time.time()
+        claims = []
+        if idempotency_key is not None:
+            claims.append(("key", f"key:{idempotency_key}", now + IDEMPOTENCY_KEY_RETENTION_SECONDS))
+        if dedupe_window > 0:
+            claims.append(("fingerprint", f"fingerprint:{digest}", now + dedupe_window))
+
+        with self._lock:
+            # Take the write lock up front so two workers cannot both claim
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM alert_claims WHERE expires_at <= ?", (now,))
+                existing = None
+                for kind, claim, _ in claims:
+                    row = self._conn.execute(
+                        "SELECT job_id, fingerprint, recipients FROM alert_claims WHERE claim = ?", (claim,)
+                    ).fetchone()
+                    if row is not None:
+                        existing = AlertClaim(*row, kind=kind)
+                        break
+
+                owner, owner_recipients = job_id, recipients
+                if existing is not None and existing.kind == "fingerprint":
+                    # Let a retry with this key find the job it was coalesced into
+                    owner, owner_recipients = existing.job_id, existing.recipients
+                    claims = claims[:1] if idempotency_key is not None else []
+                elif existing is not None:
+                    claims = []
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO alert_claims (claim, kind, job_id, fingerprint, recipients, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(claim, kind, owner, digest, owner_recipients, expires_at) for kind, claim, expires_at in claims],
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return existing
+
+    def release_alert(self, job_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM alert_claims WHERE job_id = ? AND kind = 'fingerprint'", (job_id,)
+            )
+
+    def save_alert_statuses(self, statuses: list[AlertJobStatus]) -> None:
+        """Replace the stored summaries of these jobs, kept as long as their idempotency keys"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM alert_jobs WHERE expires_at <= ?", (now,))
+            self._conn.executemany(
+                "INSERT INTO alert_jobs (job_id, status, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (job_id) DO UPDATE SET status = excluded.status, expires_at = excluded.expires_at",
+                [
+                    (status.job_id, status.model_dump_json(), now + IDEMPOTENCY_KEY_RETENTION_SECONDS)
+                    for status in statuses
+                ],
+            )
+
+    def load_alert_status(self, job_id: str) -> Optional[AlertJobStatus]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status FROM alert_jobs WHERE job_id = ? AND expires_at > ?", (job_id, time.time())
+            ).fetchone()
+        return AlertJobStatus.model_validate_json(row[0]) if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
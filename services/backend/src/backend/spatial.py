@@ -0,0 +1,198 @@
+import math
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+EARTH_RADIUS_M = 6_371_008.8
+METERS_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180
+
+# ~550 m of latitude per cell, close to the typical search radius
+DEFAULT_CELL_SIZE_DEG = 0.005
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """
+    Uniform lat/lon grid mapping cells to the keys positioned inside them
+
+    Lookups only visit the cells overlapping the query area (or the occupied
+    cells, whichever is fewer), so their cost follows the result size rather
+    than the number of indexed points.
+    """
+
+    def __init__(self, cell_size_deg: float = DEFAULT_CELL_SIZE_DEG):
+        self.cell_size_deg = cell_size_deg
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._positions: Dict[str, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (
+            math.floor(lat / self.cell_size_deg),
+            math.floor(lon / self.cell_size_deg),
+        )
+
+    def position(self, key: str) -> Optional[Tuple[float, float]]:
+        return self._positions.get(key)
+
+    def update(self, key: str, lat: float, lon: float) -> None:
+        """Insert or move a key"""
+        cell = self._cell(lat, lon)
+        previous = self._positions.get(key)
+        if previous is not None:
+            previous_cell = self._cell(*previous)
+            if previous_cell != cell:
+                self._discard(previous_cell, key)
+        self._cells.setdefault(cell, set()).add(key)
+        self._positions[key] = (lat, lon)
+
+    def remove(self, key: str) -> None:
+        previous = self._positions.pop(key, None)
+        if previous is not None:
+            self._discard(self._cell(*previous), key)
+
+    def _discard(self, cell: Tuple[int, int], key: str) -> None:
+        members = self._cells.get(cell)
+        if members is None:
+            return
+        members.discard(key)
+        if not members:
+            del self._cells[cell]
+
+    def _candidates(
+        self, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+    ) -> Iterable[str]:
+        """Keys in cells overlapping a non-wrapping bounding box"""
+        min_row, min_col = self._cell(min_lat, min_lon)
+        max_row, max_col = self._cell(max_lat, max_lon)
+        cell_count = (max_row - min_row + 1) * (max_col - min_col + 1)
+
+        if cell_count > len(self._cells):
+            for (row, col), members in self._cells.items():
+                if min_row <= row <= max_row and min_col <= col <= max_col:
+                    yield from members
+            return
+
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                members = self._cells.get((row, col))
+                if members:
+                    yield from members
+
+    def within_bbox(
+        self, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+    ) -> list[str]:
+        """
+        Keys inside a bounding box
+
+        A box whose min_lon is greater than its max_lon is treated as
+        crossing the antimeridian.
+        """
+        if min_lon > max_lon:
+            ranges = [(min_lon, 180.0), (-180.0, max_lon)]
+        else:
+            ranges = [(min_lon, max_lon)]
+
+        keys = []
+        for lo, hi in ranges:
+            for key in self._candidates(min_lat, lo, max_lat, hi):
+                lat, lon = self._positions[key]
+                if min_lat <= lat <= max_lat and lo <= lon <= hi:
+                    keys.append(key)
+        return keys
+
+    def within_radius(
+        self, lat: float, lon: float, radius_m: float
+    ) -> list[Tuple[str, float]]:
+        """Keys within `radius_m` of a point as (key, distance_m), nearest first"""
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+
+        cos_lat = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+        if cos_lat <= 0 or dlat / cos_lat >= 180:
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            dlon = dlat / cos_lat
+            min_lon = (lon - dlon + 180) % 360 - 180
+            max_lon = (lon + dlon + 180) % 360 - 180
+
+        matches = []
+        for key in self.within_bbox(min_lat, min_lon, max_lat, max_lon):
+            distance = haversine_m(lat, lon, *self._positions[key])
+            if distance <= radius_m:
+                matches.append((key, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+
+def to_local_m(lat: float, lon: float, ref_lat: float) -> Tuple[float, float]:
+    """Equirectangular projection to meters, accurate at venue scale"""
+    return (
+        lon * METERS_PER_DEGREE_LAT * math.cos(math.radians(ref_lat)),
+        lat * METERS_PER_DEGREE_LAT,
+    )
+
+
+def point_in_polygon(lat: float, lon: float, polygon: list[Tuple[float, float]]) -> bool:
+    """Ray-casting test for a point against a polygon of (lat, lon) vertices"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat):
+            crossing = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            if lon < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+def distance_to_polygon_edge_m(
+    lat: float, lon: float, polygon: list[Tuple[float, float]]
+) -> float:
+    """Distance in meters from a point to the nearest polygon edge"""
+    px, py = to_local_m(lat, lon, lat)
+    best = math.inf
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        ax, ay = to_local_m(*polygon[j], lat)
+        bx, by = to_local_m(*polygon[i], lat)
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        t = 0.0
+        if length_sq > 0:
+            t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+        best = min(best, math.hypot(px - (ax + t * dx), py - (ay + t * dy)))
+        j = i
+    return best
+
+
+def polygon_bbox(
+    polygon: list[Tuple[float, float]], margin_m: float = 0.0
+) -> Tuple[float, float, float, float]:
+    """Bounding box (min_lat, min_lon, max_lat, max_lon) of a polygon grown by margin_m"""
+    lats = [lat for lat, _ in polygon]
+    lons = [lon for _, lon in polygon]
+    dlat = margin_m / METERS_PER_DEGREE_LAT
+    cos_lat = max(
+        math.cos(math.radians(min(89.0, max(abs(lat) for lat in lats)))), 1e-6
+    )
+    dlon = dlat / cos_lat
+    return (
+        max(-90.0, min(lats) - dlat),
+        max(-180.0, min(lons) - dlon),
+        min(90.0, max(lats) + dlat),
+        min(180.0, max(lons) + dlon),
+    )
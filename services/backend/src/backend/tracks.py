@@ -0,0 +1,214 @@
+import heapq
+import math
+from array import array
+from typing import Dict, Optional, Tuple
+
+from .spatial import to_local_m
+
+DEFAULT_TRACK_CAPACITY = 86_400  # a day of 1 Hz fixes
+
+# A fix within this distance of the previous one is only kept every MAX_STATIONARY_GAP_SECONDS
+MIN_MOVE_M = 1.0
+MAX_STATIONARY_GAP_SECONDS = 30
+
+# Before Douglas-Peucker, stride-sample tracks longer than this many points per budgeted point
+PRESAMPLE_FACTOR = 50
+
+MICRODEGREES = 1_000_000
+NO_ACCURACY = 0xFFFF
+
+# (unix seconds, latitude, longitude, accuracy in meters)
+TrackPoint = Tuple[int, float, float, Optional[float]]
+
+
+class TrackBuffer:
+    """
+    Bounded ring of one user's fixes in packed array columns
+
+    Each fix costs 14 bytes: unix seconds (uint32), latitude and longitude in
+    microdegrees (int32, ~0.1 m) and accuracy in decimeters (uint16). Columns
+    grow with use and, once `capacity` is reached, the oldest fix is
+    overwritten.
+    """
+
+    __slots__ = ("capacity", "times", "lats", "lons", "accuracies", "_head")
+
+    def __init__(self, capacity: int = DEFAULT_TRACK_CAPACITY):
+        self.capacity = capacity
+        self.times = array("I")
+        self.lats = array("i")
+        self.lons = array("i")
+        self.accuracies = array("H")
+        self._head = 0
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def _last(self) -> int:
+        return (self._head - 1) % len(self.times)
+
+    def append(
+        self, timestamp: int, lat: float, lon: float, accuracy: Optional[float]
+    ) -> bool:
+        """Store a fix, returning False when it adds nothing to the track"""
+        if self.times:
+            last = self._last()
+            gap = timestamp - self.times[last]
+            if gap == 0:
+                return False
+            if 0 < gap < MAX_STATIONARY_GAP_SECONDS:
+                x0, y0 = to_local_m(
+                    self.lats[last] / MICRODEGREES, self.lons[last] / MICRODEGREES, lat
+                )
+                x1, y1 = to_local_m(lat, lon, lat)
+                if math.hypot(x1 - x0, y1 - y0) < MIN_MOVE_M:
+                    return False
+
+        packed_accuracy = (
+            NO_ACCURACY if accuracy is None else min(round(accuracy * 10), NO_ACCURACY - 1)
+        )
+        values = (
+            timestamp,
+            round(lat * MICRODEGREES),
+            round(lon * MICRODEGREES),
+            packed_accuracy,
+        )
+        columns = (self.times, self.lats, self.lons, self.accuracies)
+
+        if len(self.times) < self.capacity:
+            for column, value in zip(columns, values):
+                column.append(value)
+            self._head = len(self.times) % self.capacity
+        else:
+            for column, value in zip(columns, values):
+                column[self._head] = value
+            self._head = (self._head + 1) % self.capacity
+        return True
+
+    def points(self, since: Optional[int] = None) -> list[TrackPoint]:
+        """Stored fixes in time order, optionally only those at or after `since`"""
+        size = len(self.times)
+        start = self._head if size == self.capacity else 0
+        points = []
+        for offset in range(size):
+            i = (start + offset) % size
+            timestamp = self.times[i]
+            if since is not None and timestamp < since:
+                continue
+            accuracy = self.accuracies[i]
+            points.append((
+                timestamp,
+                self.lats[i] / MICRODEGREES,
+                self.lons[i] / MICRODEGREES,
+                None if accuracy == NO_ACCURACY else accuracy / 10,
+            ))
+        # Buffered offline fixes can arrive after newer ones
+        points.sort(key=lambda point: point[0])
+        return points
+
+
+class TrackStore:
+    """Per-user location history"""
+
+    def __init__(self, capacity: int = DEFAULT_TRACK_CAPACITY):
+        self.capacity = capacity
+        self._tracks: Dict[str, TrackBuffer] = {}
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def record(
+        self, user_id: str, timestamp: int, lat: float, lon: float, accuracy: Optional[float]
+    ) -> bool:
+        track = self._tracks.get(user_id)
+        if track is None:
+            track = self._tracks[user_id] = TrackBuffer(self.capacity)
+        return track.append(timestamp, lat, lon, accuracy)
+
+    def remove(self, user_id: str) -> None:
+        self._tracks.pop(user_id, None)
+
+    def get(self, user_id: str) -> Optional[TrackBuffer]:
+        return self._tracks.get(user_id)
+
+
+def _farthest(xs: list[float], ys: list[float], first: int, last: int) -> Tuple[float, int]:
+    """Largest distance from the line through first and last, and where it occurs"""
+    ax, ay = xs[first], ys[first]
+    dx, dy = xs[last] - ax, ys[last] - ay
+    norm = math.hypot(dx, dy)
+    inner = zip(xs[first + 1:last], ys[first + 1:last])
+    if norm == 0:
+        deviations = [math.hypot(x - ax, y - ay) for x, y in inner]
+        norm = 1.0
+    else:
+        deviations = [abs(dy * (x - ax) - dx * (y - ay)) for x, y in inner]
+    largest = max(deviations)
+    return largest / norm, first + 1 + deviations.index(largest)
+
+
+def _radial_filter(xs: list[float], ys: list[float], tolerance_m: float) -> list[int]:
+    """Indices of points at least tolerance_m from the previously kept point"""
+    kept = [0]
+    for i in range(1, len(xs) - 1):
+        j = kept[-1]
+        if math.hypot(xs[i] - xs[j], ys[i] - ys[j]) >= tolerance_m:
+            kept.append(i)
+    kept.append(len(xs) - 1)
+    return kept
+
+
+def simplify_track(
+    points: list[TrackPoint],
+    max_points: Optional[int] = None,
+    tolerance_m: float = 0.0,
+) -> list[TrackPoint]:
+    """
+    Douglas-Peucker simplification to a point budget and/or tolerance
+
+    Segments are split in order of largest deviation first, so stopping at
+    `max_points` keeps the points that matter most to the track's shape.
+    Splitting also stops once no point deviates more than `tolerance_m`.
+    Long tracks are first thinned (by radial distance when a tolerance is
+    given, by stride when far over budget) to bound the cost of the splits.
+    """
+    if len(points) <= 2 or (max_points is None and tolerance_m <= 0):
+        return points
+    budget = max(2, max_points) if max_points is not None else len(points)
+    if len(points) <= budget and tolerance_m <= 0:
+        return points
+
+    ref_lat = points[0][1]
+    projected = [to_local_m(lat, lon, ref_lat) for _, lat, lon, _ in points]
+    xs = [x for x, _ in projected]
+    ys = [y for _, y in projected]
+
+    candidates = list(range(len(points)))
+    if tolerance_m > 0:
+        candidates = _radial_filter(xs, ys, tolerance_m)
+    if len(candidates) > budget * PRESAMPLE_FACTOR:
+        stride = math.ceil(len(candidates) / (budget * PRESAMPLE_FACTOR))
+        candidates = candidates[:-1:stride] + [candidates[-1]]
+
+    points = [points[i] for i in candidates]
+    xs = [xs[i] for i in candidates]
+    ys = [ys[i] for i in candidates]
+    last = len(points) - 1
+
+    keep = {0, last}
+    heap = []
+    if last > 1:
+        distance, index = _farthest(xs, ys, 0, last)
+        heap.append((-distance, 0, last, index))
+
+    while heap and len(keep) < budget:
+        neg_distance, first, end, index = heapq.heappop(heap)
+        if -neg_distance <= tolerance_m:
+            break
+        keep.add(index)
+        for a, b in ((first, index), (index, end)):
+            if b - a > 1:
+                distance, split = _farthest(xs, ys, a, b)
+                heapq.heappush(heap, (-distance, a, b, split))
+
+    return [points[i] for i in sorted(keep)]
@@ -1,83 +1,244 @@
+import asyncio
+import json
 import os
+import time
+from typing import Callable, NamedTuple, Optional
 
 import httpx
 
+from .dispatcher import DEFAULT_MAX_ATTEMPTS, URGENCY_PRIORITY, AttemptResult, CallDispatcher, parse_retry_after
+from .faq_index import alert_query
 from .faq_loader import FAQLoader
-from .models import AlertRequest, AlertResponse
+from .metrics import VAPI_CALL_SECONDS, VAPI_CALLS, VAPI_CIRCUIT_OPEN, VAPI_CONCURRENCY_LIMIT
+from .models import AlertRequest, AlertResponse, CallOutcome
+
+DEFAULT_MAX_CONCURRENT_CALLS = 20
+DEFAULT_CALLS_PER_SECOND = 10.0
+
+VAPI_CALL_URL = "https://api.vapi.ai/call"
+
+# POST /call is not idempotent, so only failures where VAPI cannot have
+# created the call are retried: 429, 503 and errors before the request was sent
+TRANSIENT_STATUS_CODES = frozenset((503,))
+# Server errors after the request was accepted; the call may exist
+UNKNOWN_STATUS_CODES = frozenset((408, 500, 502, 504))
+PRE_REQUEST_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+_attempt_counters = {
+    outcome: VAPI_CALLS.labels(outcome)
+    for outcome in ("succeeded", "throttled", "transient", "unknown", "failed")
+}
+
+# Stands in for the customer number while the payload template is serialized
+_CUSTOMER_NUMBER_PLACEHOLDER = "\u0000customer-number\u0000"
+
+
+class CallPayloadTemplate(NamedTuple):
+    """A serialized VAPI call request split around the customer number"""
+
+    prefix: bytes
+    suffix: bytes
+
+    @classmethod
+    def build(
+        cls, phone_number_id: Optional[str], alert_message: str, assistant_context: str
+    ) -> "CallPayloadTemplate":
+        call_payload = {
+            "phoneNumberId": phone_number_id,
+            "customer": {"number": _CUSTOMER_NUMBER_PLACEHOLDER},
+            "assistant": {
+                "firstMessage": alert_message,
+                "model": {
+                    "provider": "xai",
+                    "model": "grok-3",
+                    "temperature": 0.1,
+                    "messages": [
+                        {"role": "system", "content": assistant_context},
+                        {
+                            "role": "user",
+                            "content": alert_message,
+                        },
+                    ],
+                },
+                "voice": {"provider": "11labs", "voiceId": "burt"},
+            },
+        }
+        body = json.dumps(call_payload, separators=(",", ":")).encode()
+        prefix, suffix = body.split(json.dumps(_CUSTOMER_NUMBER_PLACEHOLDER).encode())
+        return cls(prefix, suffix)
+
+    def render(self, phone_number: str) -> bytes:
+        """The request body for one recipient"""
+        return self.prefix + json.dumps(phone_number).encode() + self.suffix
 
 
 class VoiceAlertService:
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrent_calls: Optional[int] = None,
+        calls_per_second: Optional[float] = None,
+    ):
         self.api_key = os.getenv("VAPI_API_KEY")
         self.faq_loader = FAQLoader()
 
         if not self.api_key:
             raise ValueError("VAPI API key not configured")
 
+        self.phone_number_id = os.getenv("VAPI_PHONE_NUMBER_ID")
+        # Overridable so benchmarks can point dispatch at a local stand-in
+        self.call_url = os.getenv("VAPI_CALL_URL", VAPI_CALL_URL)
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+        self.max_concurrent_calls = max_concurrent_calls or int(
+            os.getenv("VAPI_MAX_CONCURRENT_CALLS", DEFAULT_MAX_CONCURRENT_CALLS)
+        )
+        self.calls_per_second = (
+            calls_per_second
+            if calls_per_second is not None
+            else float(os.getenv("VAPI_CALLS_PER_SECOND", DEFAULT_CALLS_PER_SECOND))
+        )
+
+        # One pooled keep-alive client for the life of the service
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_concurrent_calls,
+                max_keepalive_connections=self.max_concurrent_calls,
+            ),
+            timeout=httpx.Timeout(15.0),
+        )
+        self.dispatcher = CallDispatcher(
+            self.max_concurrent_calls,
+            self.calls_per_second,
+            max_attempts=int(os.getenv("VAPI_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)),
+        )
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client"""
+        await self.client.aclose()
+
     async def send_call_alerts(
-        self, alert: AlertRequest, phone_numbers: list[str]
+        self,
+        alert: AlertRequest,
+        phone_numbers: list[str],
+        on_progress: Optional[Callable[[CallOutcome], None]] = None,
     ) -> AlertResponse:
-        """Send voice call alerts using VAPI with event-specific FAQ context"""
+        """
+        Send voice call alerts using VAPI with event-specific FAQ context
+
+        Args:
+            alert: The alert to deliver
+            phone_numbers: Recipients to call
+            on_progress: Optional callback invoked when a call goes in flight and when it finishes
+
+        Returns:
+            Summary of the fan-out
+        """
         # Create base alert message
         alert_message = f"This is an urgent {alert.urgency} alert from your event organizer. {alert.event_name}. {alert.description}. Please follow safety instructions and contact event staff if you need assistance."
 
-        # Create comprehensive assistant context with FAQ if available
+        # Create assistant context with the FAQ sections relevant to this alert
+        prompt_report = None
         if alert.event_slug:
-            assistant_context = self.faq_loader.create_assistant_context(
-                alert.event_slug, alert_message
+            assistant_context, prompt_report = self.faq_loader.create_relevant_assistant_context(
+                alert.event_slug,
+                alert_message,
+                alert_query(alert.event_name, alert.description, alert.urgency),
             )
+            if prompt_report:
+                print(
+                    f"FAQ prompt for {alert.event_slug}: {prompt_report.prompt_tokens} tokens "
+                    f"({prompt_report.sections_included}/{prompt_report.sections_total} sections, "
+                    f"{prompt_report.reduction_percent}% smaller than the full FAQ)"
+                )
         else:
             assistant_context = f"{alert_message}\n\nI can help answer basic questions, but for specific event information, please contact event staff."
 
-        successful_calls = 0
-
-        print("here")
-        async with httpx.AsyncClient() as client:
-            for phone_number in phone_numbers:
-                print(f"Calling {phone_number}...")
-                try:
-                    call_payload = {
-                        "phoneNumberId": os.getenv("VAPI_PHONE_NUMBER_ID"),
-                        "customer": {"number": phone_number},
-                        "assistant": {
-                            "firstMessage": alert_message,
-                            "model": {
-                                "provider": "xai",
-                                "model": "grok-3",
-                                "temperature": 0.1,
-                                "messages": [
-                                    {"role": "system", "content": assistant_context},
-                                    {
-                                        "role": "user",
-                                        "content": alert_message,
-                                    },
-                                ],
-                            },
-                            "voice": {"provider": "11labs", "voiceId": "burt"},
-                        },
-                    }
+        # Serialize the payload once; each call only splices in its number
+        payload_template = CallPayloadTemplate.build(
+            self.phone_number_id, alert_message, assistant_context
+        )
 
-                    response = await client.post(
-                        "https://api.vapi.ai/call",
-                        headers={
-                            "Authorization": f"Bearer {self.api_key}",
-                            "Content-Type": "application/json",
-                        },
-                        json=call_payload,
-                    )
+        priority = URGENCY_PRIORITY[alert.urgency]
+        started_at = time.monotonic()
+        last_call_at = started_at
 
-                    if response.status_code == 201:
-                        successful_calls += 1
-                    else:
-                        print(
-                            f"Failed to initiate call to {phone_number}: {response.text}"
-                        )
+        async def dispatch(phone_number: str) -> bool:
+            nonlocal last_call_at
+            reported = False
 
-                except Exception as e:
-                    print(f"Failed to call {phone_number}: {e}")
+            async def attempt() -> AttemptResult:
+                nonlocal reported
+                if on_progress and not reported:
+                    on_progress(CallOutcome(phone_number=phone_number, status="in_flight"))
+                    reported = True
+                return await self._place_call(phone_number, payload_template)
+
+            result, attempts = await self.dispatcher.place(attempt, priority)
+            last_call_at = max(last_call_at, time.monotonic())
+            VAPI_CONCURRENCY_LIMIT.set(self.dispatcher.concurrency.limit)
+            VAPI_CIRCUIT_OPEN.set(0 if self.dispatcher.breaker.state == "closed" else 1)
+
+            succeeded = result.outcome == "succeeded"
+            if not succeeded:
+                print(f"Failed to call {phone_number} after {attempts} attempt(s): {result.error}")
+            if on_progress:
+                on_progress(CallOutcome(
+                    phone_number=phone_number,
+                    status="succeeded" if succeeded else "failed",
+                    error=result.error,
+                    attempts=attempts,
+                ))
+            return succeeded
+
+        results = await asyncio.gather(*(dispatch(n) for n in phone_numbers))
+        successful_calls = sum(results)
 
         return AlertResponse(
             success=successful_calls > 0,
             message="Voice call alerts initiated successfully",
             recipients_contacted=successful_calls,
+            time_to_last_call_seconds=round(last_call_at - started_at, 3),
+            prompt_report=prompt_report,
         )
+
+    async def _place_call(
+        self, phone_number: str, payload_template: CallPayloadTemplate
+    ) -> AttemptResult:
+        """Make one VAPI call request and classify the response for the dispatcher"""
+        started_at = time.perf_counter()
+        try:
+            response = await self.client.post(
+                self.call_url,
+                headers=self.headers,
+                content=payload_template.render(phone_number),
+            )
+        except PRE_REQUEST_ERRORS as e:
+            # Never reached VAPI, so retrying cannot place a second call
+            result = AttemptResult("transient", f"{type(e).__name__}: {e}")
+        except httpx.TransportError as e:
+            # Read timeouts and dropped responses; the call may have been created
+            result = AttemptResult("unknown", f"{type(e).__name__}: {e}")
+        except Exception as e:
+            result = AttemptResult("failed", str(e))
+        else:
+            VAPI_CALL_SECONDS.observe(time.perf_counter() - started_at)
+            if response.status_code == 201:
+                result = AttemptResult("succeeded")
+            else:
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code == 429:
+                    result = AttemptResult(
+                        "throttled", error, parse_retry_after(response.headers.get("retry-after"))
+                    )
+                elif response.status_code in TRANSIENT_STATUS_CODES:
+                    result = AttemptResult("transient", error)
+                elif response.status_code in UNKNOWN_STATUS_CODES:
+                    result = AttemptResult("unknown", error)
+                else:
+                    result = AttemptResult("failed", error)
+
+        _attempt_counters[result.outcome].inc()
+        return result